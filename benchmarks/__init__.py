@@ -0,0 +1 @@
+"""Замеры горячего пути генерации прогулки"""
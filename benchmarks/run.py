@@ -0,0 +1,261 @@
+"""Замеры горячего пути генерации прогулки на синтетических данных.
+
+Запуск:
+    python -m benchmarks.run --scale 1k --scale 10k --output bench.json
+    python -m benchmarks.run --scale 1k --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import gc
+import json
+from pathlib import Path
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from typing import Callable
+
+from benchmarks.synthetic import make_history, make_params, make_quests
+from domain.models import HistoryEntry, Quest
+from domain.services import MLRecommendationService, QuestRepository, WalkStorage
+from infrastructure.catalog_snapshot import CatalogSnapshot
+from infrastructure.json_storage import JsonStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
+from use_cases.generate_walk import GenerateWalkUseCase
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    scale: str
+    best: float
+    mean: float
+    runs: int
+
+
+class Workload:
+    """Каталог и история одного масштаба, разложенные по файлам во временном каталоге"""
+
+    def __init__(self, workdir: Path, size: int) -> None:
+        self.workdir = workdir
+        self.quests = make_quests(size, seed=size)
+        self.history = make_history(self.quests, size, seed=size)
+        self.params = make_params(seed=size)
+        self.quest_storage = JsonStorage(str(workdir / "quests.json"))
+        self.quest_storage.write_json([quest.to_dict() for quest in self.quests])
+        self.history_json = JsonStorage(str(workdir / "history.json"))
+        self.history_json.write_json([entry.to_dict() for entry in self.history])
+        self.history_jsonl = JsonLinesStorage(str(workdir / "history.jsonl"))
+        self.history_jsonl.write_json([entry.to_dict() for entry in self.history])
+
+    def history_copy(
+        self, storage: JsonStorage | JsonLinesStorage, name: str
+    ) -> JsonStorage | JsonLinesStorage:
+        """Отдельная копия истории для замеров, которые её дописывают"""
+        target = self.workdir / name
+        target.write_bytes(storage.path.read_bytes())
+        return type(storage)(str(target))
+
+    def candidates(self) -> list:
+        return [quest for quest in self.quests if quest.walk_type == self.params.walk_type]
+
+
+def _cases(workload: Workload) -> dict[str, Callable[[], object]]:
+    params = workload.params
+    repo = QuestRepository(storage=workload.quest_storage)
+    repo.find_matching(params)
+
+    ranker = MLRecommendationService()
+    ranker.fit(workload.history)
+    candidates = workload.candidates()
+
+    use_case = GenerateWalkUseCase(
+        quest_repo=repo,
+        recommendation_service=ranker,
+        walk_storage=WalkStorage(storage=workload.history_jsonl),
+    )
+
+    json_walks = WalkStorage(storage=workload.history_json)
+    jsonl_walks = WalkStorage(storage=workload.history_jsonl)
+    json_appends = WalkStorage(storage=workload.history_copy(workload.history_json, "append.json"))
+    jsonl_appends = WalkStorage(storage=workload.history_copy(workload.history_jsonl, "append.jsonl"))
+    new_entry = workload.history[-1]
+
+    def load_cold(walk_storage: WalkStorage) -> Callable[[], object]:
+        def run() -> object:
+            walk_storage.storage.invalidate()
+            return walk_storage.load_history()
+
+        return run
+
+    quest_records = workload.quest_storage.read_json(default=[])
+    history_records = workload.history_json.read_json(default=[])
+
+    def find_matching_cold() -> object:
+        storage = JsonStorage(str(workload.quest_storage.path))
+        return QuestRepository(storage=storage).find_matching(params)
+
+    snapshot_path = str(workload.workdir / "quests.snapshot")
+    QuestRepository(storage=workload.quest_storage, snapshot=CatalogSnapshot(snapshot_path)).find_matching(params)
+
+    def find_matching_snapshot_cold() -> object:
+        storage = JsonStorage(str(workload.quest_storage.path))
+        return QuestRepository(storage=storage, snapshot=CatalogSnapshot(snapshot_path)).find_matching(params)
+
+    def rank_cold() -> object:
+        return MLRecommendationService().rank(candidates, workload.history, params)
+
+    return {
+        "find_matching": lambda: repo.find_matching(params),
+        "find_matching_cold": find_matching_cold,
+        "find_matching_snapshot_cold": find_matching_snapshot_cold,
+        "rank": lambda: ranker.rank(candidates, None, params),
+        "rank_cold": rank_cold,
+        "generate_walk": lambda: use_case.execute(params),
+        "add_entry_json": lambda: json_appends.add_entry(new_entry),
+        "add_entry_jsonl": lambda: jsonl_appends.add_entry(new_entry),
+        "parse_quests": lambda: [Quest.from_dict(item) for item in quest_records],
+        "parse_history": lambda: [HistoryEntry.from_dict(item) for item in history_records],
+        "load_history_json": load_cold(json_walks),
+        "load_history_jsonl": load_cold(jsonl_walks),
+    }
+
+
+# замеры, которые дописывают историю: фиксированное число вызовов, чтобы файл не разрастался
+APPENDING = {"add_entry_json": 3, "add_entry_jsonl": 50}
+
+
+def _measure(func: Callable[[], object], repeat: int, number: int | None = None) -> tuple[float, float]:
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    timings = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return min(timings), sum(timings) / len(timings)
+
+
+def measure_memory(size: int) -> dict[str, float]:
+    """Память (байт на объект), которую занимают задания и записи истории после разбора JSON"""
+    quests = make_quests(size, seed=size)
+    quests_text = json.dumps([quest.to_dict() for quest in quests], ensure_ascii=False)
+    history_text = json.dumps(
+        [entry.to_dict() for entry in make_history(quests, size, seed=size)], ensure_ascii=False
+    )
+    del quests
+    usage = {}
+    for name, text, parse in [
+        ("quest_bytes", quests_text, Quest.from_dict),
+        ("history_entry_bytes", history_text, HistoryEntry.from_dict),
+    ]:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            # сырые словари освобождаются после разбора, в замер попадают только модели
+            loaded = [parse(item) for item in json.loads(text)]
+            gc.collect()
+            usage[name] = tracemalloc.get_traced_memory()[0] / len(loaded)
+        finally:
+            tracemalloc.stop()
+        del loaded
+    return usage
+
+
+def run_benchmarks(
+    scales: list[str],
+    repeat: int = 5,
+    only: list[str] | None = None,
+    sizes: dict[str, int] | None = None,
+) -> list[BenchmarkResult]:
+    sizes = sizes or SCALES
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix="walkie-bench-") as workdir:
+            workload = Workload(Path(workdir), sizes[scale])
+            for name, func in _cases(workload).items():
+                if only and name not in only:
+                    continue
+                best, mean = _measure(func, repeat, APPENDING.get(name))
+                results.append(
+                    BenchmarkResult(name=name, scale=scale, best=best, mean=mean, runs=repeat)
+                )
+    return results
+
+
+def write_report(
+    results: list[BenchmarkResult],
+    path: Path,
+    label: str | None = None,
+    memory: dict[str, dict[str, float]] | None = None,
+) -> None:
+    report = {
+        "label": label,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [asdict(result) for result in results],
+        "memory": memory or {},
+    }
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def compare(results: list[BenchmarkResult], baseline_path: Path, threshold: float) -> list[str]:
+    """Сравнить с прошлым отчётом; вернуть список регрессий сильнее threshold"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    previous = {(item["name"], item["scale"]): item for item in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result.name, result.scale))
+        if old is None:
+            continue
+        ratio = result.best / old["best"] if old["best"] else float("inf")
+        line = (
+            f"{result.name}@{result.scale}: {old['best'] * 1e3:.3f} ms -> "
+            f"{result.best * 1e3:.3f} ms (x{ratio:.2f})"
+        )
+        print(line)
+        if ratio > 1 + threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Walkie hot-path benchmarks")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="1k, 10k, 100k")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", action="append", help="run only the named benchmark")
+    parser.add_argument("--memory", action="store_true", help="also measure bytes per loaded model")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--label", help="label stored in the JSON report (e.g. a commit hash)")
+    parser.add_argument("--compare", type=Path, help="previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scale or ["1k"], repeat=args.repeat, only=args.only)
+    for result in results:
+        print(
+            f"{result.name}@{result.scale}: "
+            f"best {result.best * 1e3:.3f} ms, mean {result.mean * 1e3:.3f} ms"
+        )
+    memory = {}
+    if args.memory:
+        for scale in args.scale or ["1k"]:
+            memory[scale] = measure_memory(SCALES[scale])
+            for name, value in memory[scale].items():
+                print(f"{name}@{scale}: {value:.0f} B")
+    if args.output:
+        write_report(results, args.output, label=args.label, memory=memory)
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            print("Regressions:", *regressions, sep="\n  ")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import random
+
+from domain.models import HistoryEntry, Quest, UserParams, WalkTask
+
+WALK_TYPES = ["solo", "pair", "friends", "dog"]
+MOODS = ["спокойное", "энергичное", "бодрое", "романтичное", "игривое", "задумчивое", "весёлое"]
+GOALS = [
+    "расслабиться",
+    "размяться",
+    "потренироваться",
+    "повеселиться",
+    "исследовать город",
+    "пообщаться",
+    "сделать фото",
+    "подумать",
+]
+DURATIONS = [2, 5, 10, 15, 20, 20, 20, 20, 25, 30, 45, 60]
+
+
+def make_quests(count: int, seed: int = 0) -> list[Quest]:
+    """Каталог заданий с распределением, похожим на data/quests.json"""
+    rng = random.Random(seed)
+    return [
+        Quest(
+            id=quest_id,
+            title=f"Синтетическое задание {quest_id}",
+            walk_type=rng.choice(WALK_TYPES),
+            mood=rng.sample(MOODS, rng.randint(1, 3)),
+            goals=rng.sample(GOALS, rng.randint(1, 3)),
+            duration=rng.choice(DURATIONS),
+            location_type="город",
+        )
+        for quest_id in range(1, count + 1)
+    ]
+
+
+def make_params(seed: int = 0) -> UserParams:
+    rng = random.Random(seed)
+    return UserParams(
+        walk_type=rng.choice(WALK_TYPES),
+        mood=rng.choice(MOODS),
+        goal=rng.choice(GOALS),
+        time_limit=rng.choice([30, 60, 90, 120]),
+    )
+
+
+def make_history(quests: list[Quest], count: int, seed: int = 0) -> list[HistoryEntry]:
+    """История прогулок по заданиям из каталога, 2–5 заданий на прогулку"""
+    rng = random.Random(seed)
+    history = []
+    for entry_id in range(1, count + 1):
+        params = make_params(rng.randrange(1 << 30))
+        tasks = [
+            WalkTask(
+                quest=rng.choice(quests),
+                completed=rng.random() < 0.7,
+                photos=[{"file_path": f"photos/local/{entry_id}/task_1/photo.jpg", "storage": "local"}]
+                if rng.random() < 0.3
+                else [],
+            )
+            for _ in range(rng.randint(2, 5))
+        ]
+        history.append(
+            HistoryEntry(
+                id=entry_id,
+                date=f"2025-{1 + entry_id % 12:02d}-{1 + entry_id % 28:02d}T18:30",
+                walk_type=params.walk_type,
+                params=params,
+                tasks=tasks,
+                score=rng.randint(0, 100),
+                status=rng.choice(["finished", "finished", "aborted"]),
+                comment=None,
+            )
+        )
+    return history
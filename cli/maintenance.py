@@ -0,0 +1,125 @@
+"""Команды обслуживания каталога данных.
+
+Запуск:
+    python -m cli.maintenance compact-history --data-dir /data
+    python -m cli.maintenance verify-photos --rebuild
+    python -m cli.maintenance gc-photos --grace-hours 24 --limit 500
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from cli.views import display_message
+from domain.services import WalkStorage
+from infrastructure.database_storage import DatabaseStorage
+from infrastructure.photo_storage import LocalPhotoStorage
+from main import build_photo_storage, build_repositories, collect_photo_garbage
+
+
+def _history_path(walk_storage: WalkStorage) -> Path:
+    storage = walk_storage.storage
+    if isinstance(storage, DatabaseStorage):
+        return Path(storage.database)
+    return storage.path
+
+
+def _size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+def compact_history(data_dir: str, history_backend: str) -> None:
+    _, walk_storage = build_repositories(data_dir, history_backend)
+    path = _history_path(walk_storage)
+    before = _size(path)
+    entries, references = walk_storage.compact()
+    display_message(
+        f"Записей: {entries}, заданий ссылкой на каталог: {references}, "
+        f"размер {path.name}: {before} -> {_size(path)} байт"
+    )
+
+
+def verify_photos(data_dir: str, rebuild: bool, checksums: bool, workers: int) -> bool:
+    # манифесты одинаковы для обычного хранилища и хранилища по содержимому
+    report = LocalPhotoStorage(data_dir).verify_manifests(
+        rebuild=rebuild, checksums=checksums, workers=workers
+    )
+    for title, paths in [
+        ("Нет на диске", report.missing),
+        ("Нет в манифесте", report.untracked),
+        ("Изменились", report.changed),
+    ]:
+        for path in paths:
+            display_message(f"{title}: {path}")
+    display_message(
+        f"Прогулок: {report.entries}, фото: {report.photos}, "
+        f"расхождений: {len(report.missing) + len(report.untracked) + len(report.changed)}, "
+        f"манифестов пересобрано: {report.rebuilt}"
+    )
+    return report.clean or rebuild
+
+
+def gc_photos(
+    data_dir: str, history_backend: str, photo_store: str, grace_hours: float, limit: int
+) -> None:
+    _, walk_storage = build_repositories(data_dir, history_backend)
+    photos = build_photo_storage(data_dir, photo_store, "copy", 0)
+    report = collect_photo_garbage(photos, walk_storage, grace_seconds=grace_hours * 3600, limit=limit)
+    display_message(
+        f"Просмотрено прогулок: {report.scanned}, удалено осиротевших: "
+        f"{len(report.reclaimed_entries)}, освобождено: {report.reclaimed_bytes} байт, "
+        f"отложено (моложе {grace_hours:g} ч): {report.recent}"
+    )
+    if report.reclaimed_blobs:
+        display_message(f"Удалено blob'ов без ссылок: {report.reclaimed_blobs}")
+    if not report.finished:
+        display_message("Обход не закончен, следующий запуск продолжит с того же места.")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Walkie maintenance commands")
+    parser.add_argument("--data-dir", default=os.getenv("WALKIE_DATA_DIR", "/data"))
+    parser.add_argument(
+        "--history-backend",
+        default=os.getenv("WALKIE_HISTORY_BACKEND", "jsonl"),
+        choices=["json", "jsonl", "sqlite"],
+    )
+    parser.add_argument(
+        "--photo-store",
+        default=os.getenv("WALKIE_PHOTO_STORE", "files"),
+        choices=["files", "content"],
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "compact-history",
+        help="rewrite history so tasks reference catalog quests by id",
+    )
+    verify = commands.add_parser(
+        "verify-photos",
+        help="check per-walk photo manifests against the files on disk",
+    )
+    verify.add_argument("--rebuild", action="store_true", help="rewrite manifests that disagree with disk")
+    verify.add_argument("--checksums", action="store_true", help="also compare SHA-256 of every photo")
+    verify.add_argument("--workers", type=int, default=8)
+    gc = commands.add_parser(
+        "gc-photos",
+        help="delete photos of walks that never made it into history",
+    )
+    gc.add_argument("--grace-hours", type=float, default=24.0)
+    gc.add_argument("--limit", type=int, default=500, help="walk directories to examine per run")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact-history":
+        compact_history(args.data_dir, args.history_backend)
+    elif args.command == "verify-photos":
+        if not verify_photos(args.data_dir, args.rebuild, args.checksums, args.workers):
+            return 1
+    elif args.command == "gc-photos":
+        gc_photos(args.data_dir, args.history_backend, args.photo_store, args.grace_hours, args.limit)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
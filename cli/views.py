@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Callable, Iterable
 
-from domain.models import HistoryEntry, Walk, WalkTask
+from domain.models import HistoryEntry, HistoryPage, Walk, WalkTask
 from domain.ports import PhotoStorage
 
 
@@ -40,20 +40,17 @@ class WalkView:
             if not file_path.exists():
                 self.display_func("Файл не найден. Укажите корректный путь.")
                 continue
+            caption = self.input_func("Короткая подпись к фото (Enter — без подписи): ").strip()
             try:
-                data = file_path.read_bytes()
+                metadata = local_storage.store_photo_file(
+                    entry_id=entry_id,
+                    task_id=task_id,
+                    source_path=file_path,
+                    caption=caption or None,
+                )
             except OSError:
                 self.display_func("Не удалось прочитать файл. Попробуйте снова.")
                 continue
-            metadata = local_storage.store_photo(
-                entry_id=entry_id,
-                task_id=task_id,
-                filename=file_path.name,
-                data=data,
-            )
-            caption = self.input_func("Короткая подпись к фото (Enter — без подписи): ").strip()
-            if caption:
-                metadata["caption"] = caption
             return [metadata]
 
     def display_walk_completion(
@@ -84,13 +81,19 @@ class WalkView:
     def display_history_list(self, history: Iterable[HistoryEntry]) -> None:
         self.display_func("\nИстория прогулок:")
         for entry in history:
-            duration = sum(task.quest.duration for task in entry.tasks)
             summary = entry.comment or f"балл {entry.score}"
             self.display_func(
                 f"ID {entry.id} | {entry.date} | тип: {entry.walk_type} | "
-                f"длительность: {duration} мин | {summary}"
+                f"длительность: {entry.total_duration} мин | {summary}"
             )
 
+    def display_history_page(self, page: HistoryPage) -> None:
+        self.display_history_list(page.entries)
+        pages = max(1, -(-page.total // page.limit))
+        self.display_func(
+            f"Страница {page.offset // page.limit + 1} из {pages}, всего прогулок: {page.total}"
+        )
+
     def display_history_entry(self, entry: HistoryEntry) -> None:
         self.display_func(f"\nПрогулка {entry.id} от {entry.date}")
         self.display_func(
@@ -103,7 +106,12 @@ class WalkView:
                 self.display_func("   Фото:")
                 for photo in task.photos:
                     caption = f" ({photo['caption']})" if photo.get("caption") else ""
-                    self.display_func(f"   - {photo.get('file_path', '')}{caption}")
+                    failed = (
+                        f" — не сохранено: {photo.get('error', '')}"
+                        if photo.get("status") == "failed"
+                        else ""
+                    )
+                    self.display_func(f"   - {photo.get('file_path', '')}{caption}{failed}")
         self.display_func(f"Итоговый балл: {entry.score}")
         if entry.comment:
             self.display_func(f"Комментарий: {entry.comment}")
@@ -2,10 +2,18 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any
+import sys
+from typing import Any, Mapping
 
 
-@dataclass(frozen=True)
+# Строки-справочники (тип прогулки, настроения, цели, названия заданий) повторяются
+# в каждой записи истории, поэтому при разборе они интернируются и хранятся один раз
+_intern = sys.intern
+
+_PLACEHOLDER_TITLE = "Задание {} (удалено из каталога)"
+
+
+@dataclass(frozen=True, slots=True)
 class UserParams:
     walk_type: str
     mood: str
@@ -23,54 +31,94 @@ class UserParams:
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "UserParams":
         return cls(
-            walk_type=data["walk_type"],
-            mood=data["mood"],
-            goal=data["goal"],
-            time_limit=int(data["time_limit"]),
+            _intern(data["walk_type"]),
+            _intern(data["mood"]),
+            _intern(data["goal"]),
+            int(data["time_limit"]),
         )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Quest:
     id: int
     title: str
     walk_type: str
-    mood: list[str]
-    goals: list[str]
+    mood: tuple[str, ...]
+    goals: tuple[str, ...]
     duration: int
     location_type: str | None = None
 
+    def __post_init__(self) -> None:
+        # списки из кода и тестов приводятся к кортежам, чтобы задание было неизменяемым
+        if type(self.mood) is not tuple:
+            object.__setattr__(self, "mood", tuple(self.mood))
+        if type(self.goals) is not tuple:
+            object.__setattr__(self, "goals", tuple(self.goals))
+
     def to_dict(self) -> dict[str, Any]:
         return {
             "id": self.id,
             "title": self.title,
             "type": self.walk_type,
-            "mood": self.mood,
-            "goals": self.goals,
+            "mood": list(self.mood),
+            "goals": list(self.goals),
             "duration": self.duration,
             "location_type": self.location_type,
         }
 
+    @classmethod
+    def placeholder(cls, quest_id: int) -> "Quest":
+        """Задание, которого уже нет в каталоге: известен только id"""
+        return cls(quest_id, _PLACEHOLDER_TITLE.format(quest_id), "", (), (), 0)
+
+    @property
+    def is_placeholder(self) -> bool:
+        # у заданий каталога тип прогулки всегда задан, так что до названия доходит только заглушка
+        return (
+            not self.walk_type
+            and not self.duration
+            and not self.mood
+            and not self.goals
+            and self.location_type is None
+            and self.title == _PLACEHOLDER_TITLE.format(self.id)
+        )
+
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "Quest":
+        location_type = data.get("location_type")
         return cls(
-            id=int(data["id"]),
-            title=data["title"],
-            walk_type=data["type"],
-            mood=list(data.get("mood", [])),
-            goals=list(data.get("goals", [])),
-            duration=int(data.get("duration", 0)),
-            location_type=data.get("location_type"),
+            int(data["id"]),
+            _intern(data["title"]),
+            _intern(data["type"]),
+            tuple(map(_intern, data.get("mood", ()))),
+            tuple(map(_intern, data.get("goals", ()))),
+            int(data.get("duration", 0)),
+            _intern(location_type) if location_type is not None else None,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class WalkTask:
     quest: Quest
     completed: bool = False
     photos: list[dict[str, str]] = field(default_factory=list)
 
-    def to_dict(self) -> dict[str, Any]:
+    @property
+    def saved_photos(self) -> list[dict[str, str]]:
+        """Фото задания без тех, что не удалось сохранить (status failed)"""
+        return [photo for photo in self.photos if photo.get("status") != "failed"]
+
+    def to_dict(self, compact: bool = False) -> dict[str, Any]:
+        """compact=True — вместо копии задания только его id (задание берётся из каталога).
+
+        Заглушка удалённого задания всегда остаётся ссылкой: копия заглушки потеряла бы id
+        навсегда, а ссылка снова найдёт задание, если его вернут в каталог
+        """
+        if compact or self.quest.is_placeholder:
+            data: dict[str, Any] = {"quest_id": self.quest.id, "completed": self.completed}
+            if self.photos:
+                data["photos"] = self.photos
+            return data
         return {
             "title": self.quest.title,
             "completed": self.completed,
@@ -79,29 +127,40 @@ class WalkTask:
         }
 
     @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> "WalkTask":
-        quest_data = data.get("quest") or {
-            "id": data.get("id", 0),
-            "title": data.get("title", ""),
-            "type": data.get("type", ""),
-            "mood": data.get("mood", []),
-            "goals": data.get("goals", []),
-            "duration": data.get("duration", 0),
-            "location_type": data.get("location_type"),
-        }
+    def from_dict(cls, data: dict[str, Any], quests: Mapping[int, Quest] | None = None) -> "WalkTask":
+        quest_data = data.get("quest")
+        quest_id = data.get("quest_id")
+        if quest_data is None and quest_id is not None:
+            quest = quests.get(quest_id) if quests is not None else None
+            if quest is None:
+                quest = Quest.placeholder(quest_id)
+            photos = data.get("photos")
+            return cls(quest, bool(data.get("completed", False)), list(photos) if photos else [])
+        if quest_data is None:
+            # старый формат: поля задания лежат прямо в задаче прогулки
+            quest_data = {
+                "id": data.get("id", 0),
+                "title": data.get("title", ""),
+                "type": data.get("type", ""),
+                "mood": data.get("mood", []),
+                "goals": data.get("goals", []),
+                "duration": data.get("duration", 0),
+                "location_type": data.get("location_type"),
+            }
+        photos = data.get("photos")
         return cls(
-            quest=Quest.from_dict(quest_data),
-            completed=bool(data.get("completed", False)),
-            photos=list(data.get("photos", [])),
+            Quest.from_dict(quest_data),
+            bool(data.get("completed", False)),
+            list(photos) if photos else [],
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Walk:
     tasks: list[WalkTask]
 
 
-@dataclass
+@dataclass(slots=True)
 class HistoryEntry:
     id: int
     date: str
@@ -111,6 +170,12 @@ class HistoryEntry:
     score: int
     status: str
     comment: str | None = None
+    total_duration: int | None = None
+
+    def __post_init__(self) -> None:
+        # считается один раз при создании записи и хранится в истории
+        if self.total_duration is None:
+            self.total_duration = sum(task.quest.duration for task in self.tasks)
 
     @classmethod
     def create(
@@ -134,27 +199,116 @@ class HistoryEntry:
             comment=comment,
         )
 
-    def to_dict(self) -> dict[str, Any]:
-        return {
+    def to_dict(
+        self, catalog: Mapping[int, Quest] | None = None, catalog_version: str | None = None
+    ) -> dict[str, Any]:
+        """С каталогом задачи хранят ссылку на задание, если оно в каталоге не изменилось"""
+        if catalog is None:
+            tasks = [task.to_dict() for task in self.tasks]
+        else:
+            # задания, разобранные по этому же каталогу, — те же объекты: сравнение полей не нужно
+            tasks = []
+            for task in self.tasks:
+                known = catalog.get(task.quest.id)
+                tasks.append(task.to_dict(compact=known is task.quest or known == task.quest))
+        data = {
             "id": self.id,
             "date": self.date,
             "walk_type": self.walk_type,
             "params": self.params.to_dict(),
-            "tasks": [task.to_dict() for task in self.tasks],
+            "tasks": tasks,
             "score": self.score,
             "status": self.status,
             "comment": self.comment,
+            "total_duration": self.total_duration,
         }
+        if catalog_version is not None:
+            data["catalog"] = catalog_version
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], quests: Mapping[int, Quest] | None = None) -> "HistoryEntry":
+        return cls(
+            int(data["id"]),
+            data["date"],
+            _intern(data["walk_type"]),
+            UserParams.from_dict(data["params"]),
+            [WalkTask.from_dict(task, quests) for task in data.get("tasks", ())],
+            int(data.get("score", 0)),
+            _intern(data.get("status", "unknown")),
+            data.get("comment"),
+            data.get("total_duration"),
+        )
+
+
+@dataclass(frozen=True)
+class HistorySummary:
+    """Поля записи истории, по которым фильтруется и сортируется список"""
+
+    id: int
+    date: str
+    walk_type: str
+    status: str
+    score: int
 
     @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> "HistoryEntry":
+    def from_dict(cls, data: dict[str, Any]) -> "HistorySummary":
         return cls(
             id=int(data["id"]),
             date=data["date"],
             walk_type=data["walk_type"],
-            params=UserParams.from_dict(data["params"]),
-            tasks=[WalkTask.from_dict(task) for task in data.get("tasks", [])],
-            score=int(data.get("score", 0)),
             status=data.get("status", "unknown"),
-            comment=data.get("comment"),
+            score=int(data.get("score", 0)),
         )
+
+    def sort_key(self) -> tuple[str, int]:
+        return self.date, self.id
+
+
+@dataclass(frozen=True)
+class HistoryQuery:
+    """Страница истории: сначала новые, с необязательными фильтрами.
+
+    Границы дат включительные и сравниваются как префикс ISO-строки,
+    так что date_to="2024-01-31" включает весь день
+    """
+
+    offset: int = 0
+    limit: int = 20
+    walk_type: str | None = None
+    status: str | None = None
+    date_from: str | None = None
+    date_to: str | None = None
+    min_score: int | None = None
+    max_score: int | None = None
+
+    def matches(self, summary: HistorySummary) -> bool:
+        if self.walk_type is not None and summary.walk_type != self.walk_type:
+            return False
+        if self.status is not None and summary.status != self.status:
+            return False
+        if self.date_from is not None and summary.date[: len(self.date_from)] < self.date_from:
+            return False
+        if self.date_to is not None and summary.date[: len(self.date_to)] > self.date_to:
+            return False
+        if self.min_score is not None and summary.score < self.min_score:
+            return False
+        if self.max_score is not None and summary.score > self.max_score:
+            return False
+        return True
+
+
+@dataclass
+class HistoryPage:
+    entries: list[HistoryEntry]
+    total: int
+    offset: int
+    limit: int
+
+    @property
+    def has_previous(self) -> bool:
+        return self.offset > 0
+
+    @property
+    def has_next(self) -> bool:
+        return self.offset + len(self.entries) < self.total
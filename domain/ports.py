@@ -1,21 +1,66 @@
 from __future__ import annotations
 
-from typing import Iterable, Protocol
+from pathlib import Path
+from typing import ContextManager, Iterable, Iterator, Protocol, runtime_checkable
 
 from domain.models import HistoryEntry, Quest, UserParams
 
 
+@runtime_checkable
+class HistorySource(Protocol):
+    """История прогулок, по которой ранжировщик догоняет свою модель"""
+
+    def history_signature(self) -> tuple[int, ...] | None:
+        """Дешёвая сигнатура (без чтения записей), которая меняется при каждой записи"""
+
+    def history_mark(self) -> tuple[int, int]:
+        """(число записей, наибольший id) — по нему видно, что история изменилась"""
+
+    def iter_history(self) -> Iterator[HistoryEntry]:
+        """Все записи истории"""
+
+    def iter_history_after(self, entry_id: int) -> Iterator[HistoryEntry]:
+        """Записи с id больше entry_id"""
+
+    def locked(self, exclusive: bool = True) -> ContextManager[object]:
+        """Блокировка истории: exclusive — от записи другими сессиями, иначе разделяемая"""
+
+
 class QuestRanker(Protocol):
-    """Интерфейс для ML (чтобы предлагать нужные квесты)"""
+    """Интерфейс для ML (чтобы предлагать нужные квесты).
+
+    history — записи истории или её источник (HistorySource); по источнику
+    ранжировщик может держать модель у себя и догонять её только новыми
+    записями. None — ранжировать по уже построенной модели
+    """
 
     def rank(
         self,
         quests: Iterable[Quest],
-        history: Iterable[HistoryEntry],
+        history: Iterable[HistoryEntry] | HistorySource | None,
         params: UserParams,
     ) -> list[Quest]:
         """Возврат заданий, упорядоченных по значимости для текущего запроса"""
 
+    def score(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> list[tuple[float, Quest]]:
+        """Оценки заданий подходящего типа в исходном порядке"""
+
+    def iter_rank(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> Iterator[Quest]:
+        """То же упорядочивание, но лениво — можно остановиться после нужных k"""
+
+    def sync(self, history: HistorySource) -> None:
+        """Привести модель к текущей истории (например, после сохранения прогулки)"""
+
 
 class PhotoStorage(Protocol):
     """Интерфейс для хранения фотографий после прохождения квестов"""
@@ -26,11 +71,25 @@ class PhotoStorage(Protocol):
         task_id: int,
         filename: str,
         data: bytes,
+        caption: str | None = None,
     ) -> dict[str, str]:
         """Сохранение фото и возвраст метаданных для хранения в истории"""
 
+    def store_photo_file(
+        self,
+        entry_id: int,
+        task_id: int,
+        source_path: str | Path,
+        filename: str | None = None,
+        caption: str | None = None,
+    ) -> dict[str, str]:
+        """Сохранение фото прямо из файла, без чтения его целиком в память"""
+
     def list_photos(self, entry_id: int, task_id: int) -> list[dict[str, str]]:
         """Возврат метаданных от фото после прохождения квеста"""
 
     def delete_photo(self, photo_id: str) -> None:
         """Удаление фото по ид"""
+
+    def flush(self) -> None:
+        """Дождаться фото, которые ещё сохраняются в фоне"""
@@ -1,51 +1,226 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from dataclasses import dataclass
+from collections import ChainMap, defaultdict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache
+import hashlib
+import heapq
+import json
+import math
 import re
-from typing import Iterable
+import time
+from typing import Callable, ContextManager, Iterable, Iterator, Mapping
 
-from domain.models import HistoryEntry, Quest, UserParams, WalkTask
+from domain.models import (
+    HistoryEntry,
+    HistoryPage,
+    HistoryQuery,
+    HistorySummary,
+    Quest,
+    UserParams,
+    WalkTask,
+)
+from domain.ports import HistorySource
+from infrastructure.catalog_snapshot import CatalogSnapshot
+from infrastructure.database_storage import DatabaseStorage
+from infrastructure.file_lock import locked
+from infrastructure.history_index import HistoryIndex
+from infrastructure.id_sequence import IdSequence
 from infrastructure.json_storage import JsonStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
+from infrastructure.tracing import traced
+
+
+QuestKey = tuple[str, str, str]
+
+
+def _normalize(value: str) -> str:
+    return value.strip().lower()
+
+
+def _catalog_version(quests: Iterable[Quest]) -> str:
+    payload = json.dumps([quest.to_dict() for quest in quests], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
 
 
 @dataclass
 class QuestRepository:
     storage: JsonStorage
+    snapshot: CatalogSnapshot | None = None
+    _quests: list[Quest] = field(default_factory=list, init=False, repr=False)
+    _index: dict[QuestKey, list[Quest]] = field(default_factory=dict, init=False, repr=False)
+    _signature: tuple[int, ...] | None = field(default=None, init=False, repr=False)
+    _loaded: bool = field(default=False, init=False, repr=False)
+    _by_id: Mapping[int, Quest] = field(default_factory=dict, init=False, repr=False)
+    _version: str = field(default="", init=False, repr=False)
+    # каталог из открытого снимка; None — каталог разобран из JSON
+    _catalog: _SnapshotCatalog | None = field(default=None, init=False, repr=False)
+    _archived: set[str] = field(default_factory=set, init=False, repr=False)
+    _archives: dict[str, Mapping[int, Quest]] = field(default_factory=dict, init=False, repr=False)
 
-    def load_quests(self) -> list[Quest]:
+    def _ensure_loaded(self) -> None:
+        """Перечитывает каталог и индекс, только если файл изменился"""
+        signature = self.storage.signature()
+        if self._loaded and signature is not None and signature == self._signature:
+            return
+        opened = None
+        if self.snapshot is not None and signature is not None:
+            # каждый раз новый экземпляр: прежний остаётся открытым у тех, кто ещё держит
+            # его каталог (например, WalkStorage._reader посреди обхода истории)
+            opened = self.snapshot.opened(signature)
+        self._catalog = _SnapshotCatalog(opened) if opened is not None else None
+        if self._catalog is not None:
+            # из снимка читается только заголовок, задания разбираются по мере обращения
+            self._quests = []
+            self._index = {}
+            self._by_id = self._catalog
+            self._version = opened.version
+        else:
+            self._load_json(signature)
+        self._signature = signature
+        self._loaded = True
+
+    def _load_json(self, signature: tuple[int, ...] | None) -> None:
         data = self.storage.read_json(default=[])
-        return [Quest.from_dict(item) for item in data]
+        quests = [Quest.from_dict(item) for item in data]
+        positions: dict[QuestKey, list[int]] = defaultdict(list)
+        for position, quest in enumerate(quests):
+            moods = {_normalize(item) for item in quest.mood}
+            goals = {_normalize(item) for item in quest.goals}
+            for mood in moods:
+                for goal in goals:
+                    positions[(quest.walk_type, mood, goal)].append(position)
+        self._quests = quests
+        self._index = {key: [quests[position] for position in items] for key, items in positions.items()}
+        self._by_id = {quest.id: quest for quest in reversed(quests)}
+        self._version = _catalog_version(quests)
+        if self.snapshot is not None and signature is not None:
+            # снимок пересобирается после каждого изменения quests.json
+            try:
+                self.snapshot.save(
+                    source_signature=signature,
+                    version=self._version,
+                    records=list(data),
+                    keys=dict(positions),
+                    ids={quest.id: position for position, quest in reversed(list(enumerate(quests)))},
+                )
+            except OSError:
+                pass  # снимок только ускоряет старт, без него каталог читается из JSON
+
+    def load_quests(self) -> list[Quest]:
+        self._ensure_loaded()
+        catalog = self._catalog
+        if catalog is not None and len(self._quests) != len(catalog):
+            self._quests = [catalog.quest_at(position) for position in range(len(catalog))]
+        return list(self._quests)
+
+    def quests_by_id(self) -> Mapping[int, Quest]:
+        """Каталог по id — по нему восстанавливаются задания в компактной истории"""
+        self._ensure_loaded()
+        return self._by_id
+
+    def catalog_version(self) -> str:
+        """Хэш содержимого каталога; пишется в записи компактной истории"""
+        self._ensure_loaded()
+        return self._version
+
+    def archive_version(self) -> str:
+        """Версия каталога для новой записи истории; сам каталог этой версии сохраняется
+        в архив, чтобы компактные записи читались так же после правки quests.json"""
+        version = self.catalog_version()
+        if version not in self._archived:
+            if self._read_archive(version) is None:
+                quests = self.load_quests()
+                # каталог мог смениться между вызовами — архив пишется под версией содержимого
+                version = _catalog_version(quests)
+                self._write_archive(version, [quest.to_dict() for quest in quests])
+            self._archived.add(version)
+        return version
+
+    def archived_quests(self, version: str) -> Mapping[int, Quest] | None:
+        """Каталог заданной версии из архива; None, если такой версии там нет"""
+        if version not in self._archives:
+            records = self._read_archive(version)
+            if records is None:
+                return None
+            quests = [Quest.from_dict(item) for item in records]
+            self._archives[version] = {quest.id: quest for quest in reversed(quests)}
+        return self._archives[version]
+
+    def _archive_storage(self, version: str) -> JsonStorage:
+        return JsonStorage(str(self.storage.path.parent / "catalogs" / f"{version}.json"))
+
+    def _read_archive(self, version: str) -> list[dict] | None:
+        storage = self._archive_storage(version)
+        if not storage.path.exists():
+            return None
+        return storage.read_json(default=[])
+
+    def _write_archive(self, version: str, records: list[dict]) -> None:
+        storage = self._archive_storage(version)
+        storage.path.parent.mkdir(parents=True, exist_ok=True)
+        storage.write_json(records)
 
+    @traced("quest_repository.find_matching")
     def find_matching(self, params: UserParams) -> list[Quest]:
-        quests = self.load_quests()
-        mood = params.mood.strip().lower()
-        goal = params.goal.strip().lower()
-        matched = []
-        for quest in quests:
-            if quest.walk_type != params.walk_type:
-                continue
-            quest_moods = {item.strip().lower() for item in quest.mood}
-            quest_goals = {item.strip().lower() for item in quest.goals}
-            if mood not in quest_moods:
-                continue
-            if goal not in quest_goals:
-                continue
-            matched.append(quest)
-        return matched
+        self._ensure_loaded()
+        key = (params.walk_type, _normalize(params.mood), _normalize(params.goal))
+        catalog = self._catalog
+        if catalog is not None and key not in self._index:
+            self._index[key] = [catalog.quest_at(position) for position in catalog.snapshot.positions(key)]
+        return list(self._index.get(key, ()))
+
+
+class _SnapshotCatalog(Mapping[int, Quest]):
+    """quests_by_id поверх снимка: поиск id двоичным поиском по таблице в mmap.
+
+    Привязан к своему открытому экземпляру снимка и разобранным из него заданиям,
+    поэтому остаётся рабочим, пока на него есть ссылки, даже после того как
+    репозиторий перечитал изменившийся каталог
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot) -> None:
+        self.snapshot = snapshot
+        self._decoded: dict[int, Quest] = {}
+
+    def quest_at(self, position: int) -> Quest:
+        quest = self._decoded.get(position)
+        if quest is None:
+            quest = self._decoded[position] = Quest.from_dict(self.snapshot.record(position))
+        return quest
+
+    def __getitem__(self, quest_id: int) -> Quest:
+        position = self.snapshot.position_of(quest_id)
+        if position is None:
+            raise KeyError(quest_id)
+        return self.quest_at(position)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.snapshot.ids())
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
 
 
 class RecommendationService:
     def recommend(
         self, quests: Iterable[Quest], history: Iterable[HistoryEntry]
     ) -> list[Quest]:
+        return list(self.iter_recommended(quests, history))
+
+    def iter_recommended(
+        self, quests: Iterable[Quest], history: Iterable[HistoryEntry]
+    ) -> Iterator[Quest]:
+        """Сначала новые задания, потом уже встречавшиеся — без сортировки"""
         recent_ids = {task.quest.id for entry in history for task in entry.tasks}
-        scored: list[tuple[int, Quest]] = []
+        seen: list[Quest] = []
         for quest in quests:
-            penalty = 1 if quest.id in recent_ids else 0
-            scored.append((penalty, quest))
-        scored.sort(key=lambda pair: pair[0])
-        return [quest for _, quest in scored]
+            if quest.id in recent_ids:
+                seen.append(quest)
+            else:
+                yield quest
+        yield from seen
 
 
 class ScoringService:
@@ -54,113 +229,816 @@ class ScoringService:
         if not tasks:
             return 0
         completed = sum(1 for task in tasks if task.completed)
-        photos_bonus = sum(1 for task in tasks if task.photos)
+        photos_bonus = sum(1 for task in tasks if task.saved_photos)
         score = int((completed / len(tasks)) * 100)
         return min(100, score + photos_bonus * 5)
 
 
 @dataclass
 class WalkStorage:
-    storage: JsonStorage
+    storage: JsonStorage | JsonLinesStorage
+    sequence: IdSequence | None = None
+    index: HistoryIndex | None = None
+    quest_repo: QuestRepository | None = None
+
+    def _reader(self) -> Callable[[dict], HistoryEntry]:
+        """Разбор записей: задания-ссылки берутся из той версии каталога, с которой
+        запись сохранялась (из архива), а не из текущего quests.json"""
+        if self.quest_repo is None:
+            return HistoryEntry.from_dict
+        quest_repo = self.quest_repo
+        current = quest_repo.quests_by_id()
+        version = quest_repo.catalog_version()
+
+        def read(item: dict) -> HistoryEntry:
+            stored = item.get("catalog")
+            quests = current
+            if stored is not None and stored != version:
+                archived = quest_repo.archived_quests(stored)
+                # записи без архива своей версии (сохранённые до него) и задания, которых
+                # в архиве нет, берутся из текущего каталога
+                if archived is not None:
+                    quests = ChainMap(archived, current)
+            return HistoryEntry.from_dict(item, quests)
+
+        return read
+
+    def _serialize(self, entry: HistoryEntry) -> dict:
+        """С каталогом запись пишется компактно: задания ссылкой на id"""
+        if self.quest_repo is None:
+            return entry.to_dict()
+        version = self.quest_repo.archive_version()
+        return entry.to_dict(catalog=self.quest_repo.quests_by_id(), catalog_version=version)
 
     def load_history(self) -> list[HistoryEntry]:
         data = self.storage.read_json(default=[])
-        return [HistoryEntry.from_dict(item) for item in data]
+        read = self._reader()
+        return [read(item) for item in data]
 
     def add_entry(self, entry: HistoryEntry) -> None:
-        history = self.storage.read_json(default=[])
-        history.append(entry.to_dict())
-        self.storage.write_json(history)
+        self.storage.append_json(self._serialize(entry))
+        if self.sequence is not None:
+            self.sequence.observe(entry.id)
+
+    def iter_history(self) -> Iterator[HistoryEntry]:
+        """Ленивый обход истории: записи разбираются по одной при чтении файла"""
+        read = self._reader()
+        for item in self.storage.iter_json():
+            yield read(item)
+
+    def history_mark(self) -> tuple[int, int]:
+        """(число записей, наибольший id): по индексу или по уже прочитанному файлу"""
+        if self.index is not None:
+            return self.index.mark()
+        ids = [int(item["id"]) for item in self.storage.iter_json()]
+        return len(ids), max(ids, default=0)
+
+    def entry_ids(self) -> set[int]:
+        """id всех записей истории: по индексу или одним проходом без разбора записей"""
+        if self.index is not None:
+            return set(self.index.ids())
+        return {int(item["id"]) for item in self.storage.iter_json()}
+
+    def iter_history_after(self, entry_id: int) -> Iterator[HistoryEntry]:
+        """Записи с id больше entry_id; с индексом читаются только их строки"""
+        read = self._reader()
+        if self.index is not None:
+            for later_id in self.index.ids():
+                if later_id > entry_id:
+                    item = self.storage.read_at(self.index.offset_of(later_id))
+                    if item is not None:
+                        yield read(item)
+            return
+        for item in self.storage.iter_json():
+            if int(item["id"]) > entry_id:
+                yield read(item)
+
+    def history_signature(self) -> tuple[int, ...] | None:
+        """(mtime_ns, размер, inode) файла истории — меняется при любой записи"""
+        return self.storage.signature()
+
+    def locked(self, exclusive: bool = True) -> ContextManager[object]:
+        """Блокировка файла истории (та же, под которой идут записи с lock=True)"""
+        return locked(self.storage.path, exclusive=exclusive)
 
     def get_entry(self, entry_id: int) -> HistoryEntry | None:
-        for entry in self.load_history():
-            if entry.id == entry_id:
-                return entry
+        if self.index is not None:
+            # индекс есть только у JSONL: читается и разбирается одна строка журнала
+            offset = self.index.offset_of(entry_id)
+            item = self.storage.read_at(offset) if offset is not None else None
+            return self._reader()(item) if item is not None else None
+        # HistoryEntry собирается только для найденной записи
+        for item in self.storage.iter_json():
+            if int(item["id"]) == entry_id:
+                return self._reader()(item)
         return None
 
+    def query_history(self, query: HistoryQuery) -> HistoryPage:
+        """Страница истории; HistoryEntry собираются только для записей страницы"""
+        if self.index is not None:
+            records: Iterable[dict] = self.index.summaries()
+        else:
+            records = self.storage.iter_json()
+        summaries: dict[int, HistorySummary] = {}
+        for item in records:
+            summary = HistorySummary.from_dict(item)
+            if summary.id not in summaries and query.matches(summary):
+                summaries[summary.id] = summary
+        matched = sorted(summaries.values(), key=HistorySummary.sort_key, reverse=True)
+        page_ids = [summary.id for summary in matched[query.offset : query.offset + query.limit]]
+        return HistoryPage(
+            entries=self._load_entries(page_ids),
+            total=len(matched),
+            offset=query.offset,
+            limit=query.limit,
+        )
+
+    def _load_entries(self, entry_ids: list[int]) -> list[HistoryEntry]:
+        if self.index is not None:
+            entries = [self.get_entry(entry_id) for entry_id in entry_ids]
+            return [entry for entry in entries if entry is not None]
+        wanted = set(entry_ids)
+        read = self._reader()
+        found: dict[int, HistoryEntry] = {}
+        for item in self.storage.iter_json():
+            entry_id = int(item["id"])
+            if entry_id in wanted and entry_id not in found:
+                found[entry_id] = read(item)
+                if len(found) == len(wanted):
+                    break
+        return [found[entry_id] for entry_id in entry_ids if entry_id in found]
+
+    def compact(self) -> tuple[int, int]:
+        """Переписать историю в компактном формате; (записей, заданий стало ссылками)"""
+        if self.quest_repo is None:
+            raise ValueError("Compact history requires a quest repository")
+        # чтение и перезапись под одной блокировкой: запись другой сессии не потеряется
+        with locked(self.storage.path):
+            read = self._reader()
+            records = [self._serialize(read(item)) for item in self.storage.iter_json()]
+            self.storage.write_json(records)
+        return len(records), _count_quest_refs(records)
+
+    def next_id(self) -> int:
+        """Новый id; со sequence он выдаётся один раз и не зависит от размера истории"""
+        if self.sequence is not None:
+            return self.sequence.allocate(initial=self._scan_next_id)
+        return self._scan_next_id()
+
+    def _scan_next_id(self) -> int:
+        return max((int(item["id"]) for item in self.storage.iter_json()), default=0) + 1
+
+
+def _count_quest_refs(records: Iterable[dict]) -> int:
+    return sum(1 for item in records for task in item["tasks"] if "quest_id" in task)
+
+
+_QUEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS quests (
+    position INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL,
+    walk_type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quests_walk_type ON quests (walk_type, position);
+CREATE TABLE IF NOT EXISTS quest_index (
+    walk_type TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    goal TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quest_index_lookup ON quest_index (walk_type, mood, goal, position);
+CREATE TABLE IF NOT EXISTS catalogs (version TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    walk_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_date ON history (date);
+CREATE INDEX IF NOT EXISTS history_listing ON history (date DESC, id DESC);
+CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+@dataclass
+class DatabaseQuestRepository(QuestRepository):
+    """Каталог заданий в SQLite; source — quests.json, из которого он синхронизируется"""
+
+    storage: DatabaseStorage
+    source: JsonStorage | None = None
+    _catalog_signature: tuple[int, ...] | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.storage.executescript(_QUEST_SCHEMA)
+
+    def _ensure_catalog(self) -> None:
+        self._ensure_loaded()
+        if self._version and self._catalog_signature == self._signature:
+            return
+        quests = self.load_quests()
+        self._by_id = {quest.id: quest for quest in reversed(quests)}
+        self._version = _catalog_version(quests)
+        self._catalog_signature = self._signature
+
+    def quests_by_id(self) -> Mapping[int, Quest]:
+        self._ensure_catalog()
+        return self._by_id
+
+    def catalog_version(self) -> str:
+        self._ensure_catalog()
+        return self._version
+
+    def _ensure_loaded(self) -> None:
+        if self.source is None:
+            return
+        signature = self.source.signature()
+        if self._loaded and signature is not None and signature == self._signature:
+            return
+        stamp = json.dumps(signature)
+        rows = self.storage.fetch("SELECT value FROM meta WHERE key = 'quests_signature'")
+        if not rows or rows[0]["value"] != stamp:
+            data = self.source.read_json(default=[])
+            self.import_quests([Quest.from_dict(item) for item in data])
+            self.storage.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('quests_signature', ?)",
+                (stamp,),
+            )
+        self._signature = signature
+        self._loaded = True
+
+    def import_quests(self, quests: Iterable[Quest]) -> None:
+        """Полная замена каталога и индекса в одной транзакции"""
+        quest_rows = []
+        index_rows = []
+        for position, quest in enumerate(quests):
+            quest_rows.append(
+                (position, quest.id, quest.walk_type, json.dumps(quest.to_dict(), ensure_ascii=False))
+            )
+            moods = {_normalize(item) for item in quest.mood}
+            goals = {_normalize(item) for item in quest.goals}
+            index_rows.extend(
+                (quest.walk_type, mood, goal, position) for mood in moods for goal in goals
+            )
+        self._version = ""
+        with self.storage.transaction():
+            self.storage.execute("DELETE FROM quests")
+            self.storage.execute("DELETE FROM quest_index")
+            self.storage.executemany(
+                "INSERT INTO quests (position, id, walk_type, data) VALUES (?, ?, ?, ?)",
+                quest_rows,
+            )
+            self.storage.executemany(
+                "INSERT INTO quest_index (walk_type, mood, goal, position) VALUES (?, ?, ?, ?)",
+                index_rows,
+            )
+
+    def _read_archive(self, version: str) -> list[dict] | None:
+        rows = self.storage.fetch("SELECT data FROM catalogs WHERE version = ?", (version,))
+        return json.loads(rows[0]["data"]) if rows else None
+
+    def _write_archive(self, version: str, records: list[dict]) -> None:
+        self.storage.execute(
+            "INSERT OR IGNORE INTO catalogs (version, data) VALUES (?, ?)",
+            (version, json.dumps(records, ensure_ascii=False)),
+        )
+
+    def load_quests(self) -> list[Quest]:
+        self._ensure_loaded()
+        rows = self.storage.fetch("SELECT data FROM quests ORDER BY position")
+        return [Quest.from_dict(json.loads(row["data"])) for row in rows]
+
+    @traced("quest_repository.find_matching")
+    def find_matching(self, params: UserParams) -> list[Quest]:
+        self._ensure_loaded()
+        rows = self.storage.fetch(
+            "SELECT quests.data FROM quest_index "
+            "JOIN quests ON quests.position = quest_index.position "
+            "WHERE quest_index.walk_type = ? AND quest_index.mood = ? AND quest_index.goal = ? "
+            "ORDER BY quest_index.position",
+            (params.walk_type, _normalize(params.mood), _normalize(params.goal)),
+        )
+        return [Quest.from_dict(json.loads(row["data"])) for row in rows]
+
+
+@dataclass
+class DatabaseWalkStorage(WalkStorage):
+    """История прогулок в SQLite с индексами по id и дате"""
+
+    storage: DatabaseStorage
+
+    def __post_init__(self) -> None:
+        self.storage.executescript(_HISTORY_SCHEMA)
+
+    @staticmethod
+    def _row(entry_data: dict) -> tuple:
+        return (
+            int(entry_data["id"]),
+            entry_data["date"],
+            entry_data["walk_type"],
+            entry_data.get("status", "unknown"),
+            int(entry_data.get("score", 0)),
+            json.dumps(entry_data, ensure_ascii=False),
+        )
+
+    def load_history(self) -> list[HistoryEntry]:
+        rows = self.storage.fetch("SELECT data FROM history ORDER BY id")
+        read = self._reader()
+        return [read(json.loads(row["data"])) for row in rows]
+
+    def iter_history(self) -> Iterator[HistoryEntry]:
+        read = self._reader()
+        for row in self.storage.iterate("SELECT data FROM history ORDER BY id"):
+            yield read(json.loads(row["data"]))
+
+    def query_history(self, query: HistoryQuery) -> HistoryPage:
+        conditions = []
+        parameters: list = []
+        if query.walk_type is not None:
+            conditions.append("walk_type = ?")
+            parameters.append(query.walk_type)
+        if query.status is not None:
+            conditions.append("status = ?")
+            parameters.append(query.status)
+        if query.date_from is not None:
+            conditions.append("substr(date, 1, ?) >= ?")
+            parameters += [len(query.date_from), query.date_from]
+        if query.date_to is not None:
+            conditions.append("substr(date, 1, ?) <= ?")
+            parameters += [len(query.date_to), query.date_to]
+        if query.min_score is not None:
+            conditions.append("score >= ?")
+            parameters.append(query.min_score)
+        if query.max_score is not None:
+            conditions.append("score <= ?")
+            parameters.append(query.max_score)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        total = self.storage.fetch(f"SELECT COUNT(*) AS total FROM history{where}", tuple(parameters))
+        rows = self.storage.fetch(
+            f"SELECT data FROM history{where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+            (*parameters, query.limit, query.offset),
+        )
+        read = self._reader()
+        return HistoryPage(
+            entries=[read(json.loads(row["data"])) for row in rows],
+            total=int(total[0]["total"]),
+            offset=query.offset,
+            limit=query.limit,
+        )
+
+    def add_entry(self, entry: HistoryEntry) -> None:
+        # строка собирается до BEGIN: версия каталога может сама синхронизировать quests.json
+        row = self._row(self._serialize(entry))
+        with self.storage.transaction():
+            self.storage.execute(
+                "INSERT INTO history (id, date, walk_type, status, score, data) VALUES (?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self.storage.execute(
+                "UPDATE sequences SET value = MAX(value, ?) WHERE name = 'history'",
+                (entry.id + 1,),
+            )
+
+    def history_mark(self) -> tuple[int, int]:
+        rows = self.storage.fetch("SELECT COUNT(*) AS total, COALESCE(MAX(id), 0) AS last FROM history")
+        return int(rows[0]["total"]), int(rows[0]["last"])
+
+    def entry_ids(self) -> set[int]:
+        return {int(row["id"]) for row in self.storage.iterate("SELECT id FROM history")}
+
+    def iter_history_after(self, entry_id: int) -> Iterator[HistoryEntry]:
+        read = self._reader()
+        for row in self.storage.iterate("SELECT data FROM history WHERE id > ? ORDER BY id", (entry_id,)):
+            yield read(json.loads(row["data"]))
+
+    def history_signature(self) -> tuple[int, ...] | None:
+        # история в БД только дописывается (compact не меняет id), MAX(id) — по первичному ключу
+        rows = self.storage.fetch("SELECT COALESCE(MAX(id), 0) AS last FROM history")
+        return (int(rows[0]["last"]),)
+
+    def locked(self, exclusive: bool = True) -> ContextManager[object]:
+        """BEGIN IMMEDIATE: другие сессии не пишут историю, пока она открыта.
+        Для чтения блокировка не нужна: SQLite и так читает согласованный снимок"""
+        return self.storage.transaction() if exclusive else nullcontext()
+
+    def get_entry(self, entry_id: int) -> HistoryEntry | None:
+        rows = self.storage.fetch("SELECT data FROM history WHERE id = ?", (entry_id,))
+        if not rows:
+            return None
+        return self._reader()(json.loads(rows[0]["data"]))
+
     def next_id(self) -> int:
-        history = self.load_history()
-        if not history:
-            return 1
-        return max(entry.id for entry in history) + 1
+        """Выдача id из таблицы sequences; BEGIN IMMEDIATE разводит параллельные сессии"""
+        with self.storage.transaction():
+            self.storage.execute(
+                "INSERT OR IGNORE INTO sequences (name, value) "
+                "SELECT 'history', COALESCE(MAX(id), 0) + 1 FROM history"
+            )
+            rows = self.storage.fetch("SELECT value FROM sequences WHERE name = 'history'")
+            value = int(rows[0]["value"])
+            self.storage.execute(
+                "UPDATE sequences SET value = ? WHERE name = 'history'", (value + 1,)
+            )
+        return value
+
+    def compact(self) -> tuple[int, int]:
+        if self.quest_repo is None:
+            raise ValueError("Compact history requires a quest repository")
+        read = self._reader()
+        with self.storage.transaction():
+            records = [
+                self._serialize(read(json.loads(row["data"])))
+                for row in self.storage.fetch("SELECT data FROM history ORDER BY id")
+            ]
+            self.storage.executemany(
+                "UPDATE history SET data = ? WHERE id = ?",
+                [(json.dumps(item, ensure_ascii=False), item["id"]) for item in records],
+            )
+        return len(records), _count_quest_refs(records)
+
+    def import_from(self, legacy: JsonStorage | JsonLinesStorage) -> bool:
+        """Однократный перенос истории из JSON/JSONL, пока таблица пуста"""
+        if not legacy.path.exists():
+            return False
+        if self.storage.fetch("SELECT 1 FROM history LIMIT 1"):
+            return False
+        records = legacy.read_json(default=[])
+        with self.storage.transaction():
+            self.storage.executemany(
+                "INSERT OR REPLACE INTO history (id, date, walk_type, status, score, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row(item) for item in records],
+            )
+            self.storage.execute(
+                "UPDATE sequences SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) + 1 FROM history)) "
+                "WHERE name = 'history'"
+            )
+        return bool(records)
+
+
+def _plain(signature: tuple | None) -> list | None:
+    # сигнатура хранится в JSON-снимке, где кортеж становится списком
+    return None if signature is None else list(signature)
+
+
+@dataclass(frozen=True)
+class QuestFeatures:
+    """Предрасчитанные признаки задания для ранжирования"""
+
+    source_mood: tuple[str, ...]
+    source_goals: tuple[str, ...]
+    moods: tuple[str, ...]
+    goals: tuple[str, ...]
+    mood_set: frozenset[str]
+    goal_set: frozenset[str]
+    mood_tokens: frozenset[str]
+    goal_tokens: frozenset[str]
+
+    @classmethod
+    def from_quest(cls, quest: Quest, tokenize: Callable[[str], frozenset[str]]) -> "QuestFeatures":
+        moods = tuple(item.lower() for item in quest.mood)
+        goals = tuple(item.lower() for item in quest.goals)
+        return cls(
+            source_mood=tuple(quest.mood),
+            source_goals=tuple(quest.goals),
+            moods=moods,
+            goals=goals,
+            mood_set=frozenset(moods),
+            goal_set=frozenset(goals),
+            mood_tokens=frozenset().union(*(tokenize(item) for item in quest.mood)),
+            goal_tokens=frozenset().union(*(tokenize(item) for item in quest.goals)),
+        )
+
+    def matches(self, quest: Quest) -> bool:
+        return self.source_mood == tuple(quest.mood) and self.source_goals == tuple(quest.goals)
 
 
 class MLRecommendationService:
-    """несложная ML-ранжировка на основе вводов и истории"""
+    """несложная ML-ранжировка на основе вводов и истории
 
-    def __init__(self) -> None:
+    Модель (веса настроений/целей и счётчики заданий) хранится в сервисе.
+    history в rank/score/iter_rank — это либо записи (модель строится по ним
+    заново, как fit), либо источник истории (WalkStorage): тогда модель догоняется
+    sync'ом только новыми записями, а если сигнатура истории не менялась —
+    без чтения истории вовсе. None — текущая модель как есть. Снимок (snapshot)
+    помнит, до какой записи истории он дошёл, поэтому после перезапуска или
+    записей другой сессии модель догоняется, а не расходится с историей
+    """
+
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, snapshot: JsonStorage | None = None) -> None:
+        self.snapshot = snapshot
         self._mood_weights: dict[str, float] = {}
         self._goal_weights: dict[str, float] = {}
         self._quest_counts: dict[int, int] = {}
+        # (число записей, наибольший id) истории, которую модель уже учла,
+        # и дешёвая сигнатура источника истории в этот момент
+        self._mark = (0, 0)
+        self._history_signature: list | None = None
+        self._snapshot_signature: tuple[int, ...] | None = None
+        self._ready = False
+        self._features: dict[int, QuestFeatures] = {}
+
+    def _features_for(self, quest: Quest) -> QuestFeatures:
+        """Признаки задания из кэша; пересчёт, если задание в каталоге изменилось"""
+        features = self._features.get(quest.id)
+        if features is None or not features.matches(quest):
+            features = QuestFeatures.from_quest(quest, self._tokenize)
+            self._features[quest.id] = features
+        return features
 
     @staticmethod
-    def _tokenize(text: str) -> set[str]:
+    @lru_cache(maxsize=4096)
+    def _tokenize(text: str) -> frozenset[str]:
         tokens = re.findall(r"[a-zA-Zа-яА-Я0-9]+", text.lower())
-        return set(tokens)
+        return frozenset(tokens)
 
     @staticmethod
-    def _token_overlap(source: set[str], target: set[str]) -> float:
+    def _token_overlap(source: frozenset[str], target: frozenset[str]) -> float:
         if not source or not target:
             return 0.0
         return len(source & target) / max(1, len(source))
 
-    def _refresh_model(self, history: Iterable[HistoryEntry]) -> None:
-        mood_weights: dict[str, float] = defaultdict(float)
-        goal_weights: dict[str, float] = defaultdict(float)
-        quest_counts: dict[int, int] = defaultdict(int)
+    def _absorb(self, entry: HistoryEntry) -> None:
+        for task in entry.tasks:
+            weight = 1.0
+            if task.completed:
+                weight += 0.75
+            photos = task.saved_photos
+            if photos:
+                weight += 0.1 * len(photos)
+            for mood in task.quest.mood:
+                key = mood.lower()
+                self._mood_weights[key] = self._mood_weights.get(key, 0.0) + weight
+            for goal in task.quest.goals:
+                key = goal.lower()
+                self._goal_weights[key] = self._goal_weights.get(key, 0.0) + weight
+            self._quest_counts[task.quest.id] = self._quest_counts.get(task.quest.id, 0) + 1
 
+    @traced("ml_recommendation.fit")
+    def fit(self, history: Iterable[HistoryEntry]) -> None:
+        """Построить модель заново по записям истории"""
+        self._mood_weights = {}
+        self._goal_weights = {}
+        self._quest_counts = {}
+        self._mark = (0, 0)
+        self._history_signature = None
         for entry in history:
-            for task in entry.tasks:
-                weight = 1.0
-                if task.completed:
-                    weight += 0.75
-                if task.photos:
-                    weight += 0.1 * len(task.photos)
-                for mood in task.quest.mood:
-                    mood_weights[mood.lower()] += weight
-                for goal in task.quest.goals:
-                    goal_weights[goal.lower()] += weight
-                quest_counts[task.quest.id] += 1
-
-        self._mood_weights = dict(mood_weights)
-        self._goal_weights = dict(goal_weights)
-        self._quest_counts = dict(quest_counts)
+            self._absorb(entry)
+            self._mark = (self._mark[0] + 1, max(self._mark[1], entry.id))
+        self._ready = True
 
-    def rank(
+    @traced("ml_recommendation.sync")
+    def sync(self, history: HistorySource) -> None:
+        """Догнать модель до истории: не изменилась — ничего, дописанные записи —
+        только они, иначе (история сброшена, другой формат) — полный пересчёт.
+
+        Изменения распознаются по дешёвой сигнатуре истории под разделяемой
+        блокировкой; число записей и новые записи читаются, только если она другая
+        """
+        with history.locked(exclusive=False):
+            signature = _plain(history.history_signature())
+            if self._ready and signature is not None and signature == self._history_signature:
+                return
+        with history.locked():
+            if self.snapshot is not None and self.snapshot.signature() != self._snapshot_signature:
+                # снимок обновила другая сессия (или его ещё не читали)
+                self._load_snapshot()
+            signature = _plain(history.history_signature())
+            if self._ready and signature is not None and signature == self._history_signature:
+                return
+            count, last_id = history.history_mark()
+            known_count, known_id = self._mark
+            if self._ready and (count, last_id) == (known_count, known_id):
+                self._history_signature = signature
+                self._save_snapshot()
+                return
+            if self._ready and count > known_count and last_id >= known_id:
+                delta = list(history.iter_history_after(known_id))
+                if known_count + len(delta) == count:
+                    for entry in delta:
+                        self._absorb(entry)
+                    self._mark = (count, last_id)
+                    self._history_signature = signature
+                    self._save_snapshot()
+                    return
+            self.fit(history.iter_history())
+            self._history_signature = signature
+            self._save_snapshot()
+
+    def _prepare(self, history: Iterable[HistoryEntry] | HistorySource | None) -> None:
+        if history is None:
+            self._ensure_model()
+        elif isinstance(history, HistorySource):
+            self.sync(history)
+        else:
+            self.fit(history)
+
+    def _ensure_model(self) -> None:
+        """Без fit/sync модель берётся из снимка, а без него остаётся пустой"""
+        if self._ready or self._load_snapshot():
+            return
+        self.fit([])
+
+    def _load_snapshot(self) -> bool:
+        signature = None if self.snapshot is None else self.snapshot.signature()
+        if signature is None:
+            return False
+        data = self.snapshot.read_json(default={})
+        self._snapshot_signature = signature
+        if data.get("version") != self.SNAPSHOT_VERSION:
+            return False
+        self._mood_weights = dict(data["mood_weights"])
+        self._goal_weights = dict(data["goal_weights"])
+        self._quest_counts = {int(key): value for key, value in data["quest_counts"].items()}
+        self._mark = (int(data["entries"]), int(data["last_id"]))
+        self._history_signature = data.get("history_signature")
+        self._ready = True
+        return True
+
+    def _save_snapshot(self) -> None:
+        if self.snapshot is None:
+            return
+        self.snapshot.write_json(
+            {
+                "version": self.SNAPSHOT_VERSION,
+                "entries": self._mark[0],
+                "last_id": self._mark[1],
+                "history_signature": self._history_signature,
+                "mood_weights": dict(self._mood_weights),
+                "goal_weights": dict(self._goal_weights),
+                "quest_counts": {str(key): value for key, value in self._quest_counts.items()},
+            }
+        )
+        self._snapshot_signature = self.snapshot.signature()
+
+    @traced("ml_recommendation.score")
+    def score(
         self,
         quests: Iterable[Quest],
-        history: Iterable[HistoryEntry],
+        history: Iterable[HistoryEntry] | HistorySource | None,
         params: UserParams,
-    ) -> list[Quest]:
-        self._refresh_model(history)
+    ) -> list[tuple[float, Quest]]:
+        """Оценки заданий нужного типа в исходном порядке"""
+        self._prepare(history)
         mood_tokens = self._tokenize(params.mood)
         goal_tokens = self._tokenize(params.goal)
+        mood_key = params.mood.lower()
+        goal_key = params.goal.lower()
         scored: list[tuple[float, Quest]] = []
 
         for quest in quests:
             if quest.walk_type != params.walk_type:
                 continue
-            quest_mood_tokens: set[str] = set()
-            for mood in quest.mood:
-                quest_mood_tokens |= self._tokenize(mood)
-            quest_goal_tokens: set[str] = set()
-            for goal in quest.goals:
-                quest_goal_tokens |= self._tokenize(goal)
+            features = self._features_for(quest)
 
             score = 0.0
-            score += self._token_overlap(mood_tokens, quest_mood_tokens) * 2.0
-            score += self._token_overlap(goal_tokens, quest_goal_tokens) * 2.0
-            if params.mood.lower() in {m.lower() for m in quest.mood}:
+            score += self._token_overlap(mood_tokens, features.mood_tokens) * 2.0
+            score += self._token_overlap(goal_tokens, features.goal_tokens) * 2.0
+            if mood_key in features.mood_set:
                 score += 1.5
-            if params.goal.lower() in {g.lower() for g in quest.goals}:
+            if goal_key in features.goal_set:
                 score += 1.5
-            for mood in quest.mood:
-                score += self._mood_weights.get(mood.lower(), 0.0) * 0.2
-            for goal in quest.goals:
-                score += self._goal_weights.get(goal.lower(), 0.0) * 0.2
+            for mood in features.moods:
+                score += self._mood_weights.get(mood, 0.0) * 0.2
+            for goal in features.goals:
+                score += self._goal_weights.get(goal, 0.0) * 0.2
             score -= self._quest_counts.get(quest.id, 0) * 1.0
 
             scored.append((score, quest))
+        return scored
 
+    @traced("ml_recommendation.rank")
+    def rank(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> list[Quest]:
+        scored = self.score(quests, history, params)
         scored.sort(key=lambda item: item[0], reverse=True)
         return [quest for _, quest in scored]
+
+    def iter_rank(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> Iterator[Quest]:
+        """Задания в порядке rank, но лениво: heapify O(n) и O(log n) на каждое"""
+        heap = [
+            (-score, position, quest)
+            for position, (score, quest) in enumerate(self.score(quests, history, params))
+        ]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+
+@dataclass
+class KnapsackWalkAssembler:
+    """Сборка прогулки как задача о рюкзаке 0/1: ценность — оценка ранжировщика, вес — минуты
+
+    time_budget (секунды) отсчитывается с начала assemble, так что сортировка и отсев
+    кандидатов тратят его же; точный ДП по минутам стартует, только если бюджет
+    остался, и прерывается по нему. Иначе (или если таблица больше max_cells)
+    берётся жадная эвристика по «ценности за минуту». Сортировка и эвристика
+    (O(n log n)) выполняются всегда — бюджет ограничивает только ДП
+    """
+
+    time_budget: float = 0.05
+    max_cells: int = 2_000_000
+
+    @staticmethod
+    def _value(score: float, duration: int) -> float:
+        # отрицательные оценки не штрафуют набор, а при равной ценности
+        # выигрывает вариант, занимающий больше времени
+        return max(score, 0.0) + 1e-6 * duration
+
+    def assemble(self, scored: Iterable[tuple[float, Quest]], time_limit: int) -> list[Quest]:
+        """Лучший по сумме оценок набор заданий, в порядке убывания оценки"""
+        deadline = time.perf_counter() + self.time_budget
+        ranked = sorted(scored, key=lambda item: item[0], reverse=True)
+        free = [quest for _, quest in ranked if quest.duration <= 0]
+        items = self._prune(
+            [
+                (self._value(score, quest.duration), quest)
+                for score, quest in ranked
+                if 0 < quest.duration <= time_limit
+            ],
+            time_limit,
+        )
+        chosen = None
+        if (
+            items
+            and len(items) * (time_limit + 1) <= self.max_cells
+            and time.perf_counter() < deadline
+        ):
+            chosen = self._solve_exact(items, time_limit, deadline)
+        if chosen is None:
+            chosen = self._solve_greedy(items, time_limit)
+        selected = {id(quest) for quest in chosen} | {id(quest) for quest in free}
+        return [quest for _, quest in ranked if id(quest) in selected]
+
+    @staticmethod
+    def _prune(items: list[tuple[float, Quest]], time_limit: int) -> list[tuple[float, Quest]]:
+        """Из заданий одной длительности d в рюкзак влезает не больше time_limit // d лучших"""
+        by_duration: dict[int, list[tuple[float, Quest]]] = defaultdict(list)
+        for item in items:
+            by_duration[item[1].duration].append(item)
+        pruned: list[tuple[float, Quest]] = []
+        for duration, group in by_duration.items():
+            group.sort(key=lambda item: item[0], reverse=True)
+            pruned.extend(group[: time_limit // duration])
+        return pruned
+
+    @staticmethod
+    def _solve_exact(
+        items: list[tuple[float, Quest]], time_limit: int, deadline: float
+    ) -> list[Quest] | None:
+        step = 0
+        for _, quest in items:
+            step = math.gcd(step, quest.duration)
+        capacity = time_limit // step
+        weights = [quest.duration // step for _, quest in items]
+        best = [0.0] * (capacity + 1)
+        taken: list[list[bool]] = []
+        for (value, _), weight in zip(items, weights):
+            if time.perf_counter() > deadline:
+                return None
+            head = best[:weight]
+            added = [prev + value for prev in best[: capacity + 1 - weight]]
+            tail = [stay if stay >= add else add for stay, add in zip(best[weight:], added)]
+            taken.append([False] * weight + [a != b for a, b in zip(tail, best[weight:])])
+            best = head + tail
+        chosen: list[Quest] = []
+        remaining = capacity
+        for index in range(len(items) - 1, -1, -1):
+            if taken[index][remaining]:
+                chosen.append(items[index][1])
+                remaining -= weights[index]
+        return chosen
+
+    @staticmethod
+    def _solve_greedy(items: list[tuple[float, Quest]], time_limit: int) -> list[Quest]:
+        by_density = sorted(items, key=lambda item: item[0] / item[1].duration, reverse=True)
+        chosen: list[Quest] = []
+        total = 0.0
+        remaining = time_limit
+        for value, quest in by_density:
+            if quest.duration <= remaining:
+                chosen.append(quest)
+                total += value
+                remaining -= quest.duration
+        # классическая поправка: одно самое ценное задание может оказаться лучше
+        best_single = max(items, key=lambda item: item[0], default=None)
+        if best_single is not None and best_single[0] > total:
+            return [best_single[1]]
+        return chosen
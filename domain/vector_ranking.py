@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable, Iterator
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость
+    np = None
+
+from domain.models import HistoryEntry, Quest, UserParams
+from domain.ports import HistorySource
+from domain.services import MLRecommendationService, QuestFeatures
+from infrastructure.json_storage import JsonStorage
+from infrastructure.tracing import traced
+
+
+class _Vocabulary:
+    def __init__(self) -> None:
+        self.index: dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        return self.index.setdefault(value, len(self.index))
+
+    def get(self, value: str) -> int | None:
+        return self.index.get(value)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class QuestMatrix:
+    """Задания в виде матриц numpy: строка — задание, столбцы — словари настроений/целей/токенов"""
+
+    def __init__(self) -> None:
+        self.moods = _Vocabulary()
+        self.goals = _Vocabulary()
+        self.tokens = _Vocabulary()
+        self._rows: dict[tuple[int, tuple[str, ...], tuple[str, ...]], int] = {}
+        self._ids: list[int] = []
+        self._features: list[QuestFeatures] = []
+        self._dirty = True
+
+    def rows_for(
+        self,
+        quests: Iterable[Quest],
+        features_for: Callable[[Quest], QuestFeatures],
+    ) -> "np.ndarray":
+        """Номера строк для заданий; новые и изменившиеся задания кодируются заново
+
+        Строка привязана к id вместе с настроениями и целями: у заглушки и у
+        задания из каталога (или у двух версий каталога) id может совпадать.
+        """
+        rows = []
+        for quest in quests:
+            features = features_for(quest)
+            key = (quest.id, features.source_mood, features.source_goals)
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._ids)
+                self._rows[key] = row
+                self._ids.append(quest.id)
+                self._features.append(features)
+                self._dirty = True
+            rows.append(row)
+        if self._dirty:
+            self._build()
+        return np.array(rows, dtype=np.intp)
+
+    def _build(self) -> None:
+        for features in self._features:
+            for mood in features.moods:
+                self.moods.add(mood)
+            for goal in features.goals:
+                self.goals.add(goal)
+            for token in features.mood_tokens | features.goal_tokens:
+                self.tokens.add(token)
+        size = len(self._features)
+        # последний столбец — «пустая» позиция с нулевым весом
+        self.mood_pad = len(self.moods)
+        self.goal_pad = len(self.goals)
+        max_moods = max((len(item.moods) for item in self._features), default=0)
+        max_goals = max((len(item.goals) for item in self._features), default=0)
+        self.mood_positions = np.full((size, max_moods), self.mood_pad, dtype=np.intp)
+        self.goal_positions = np.full((size, max_goals), self.goal_pad, dtype=np.intp)
+        self.mood_sets = np.zeros((size, self.mood_pad + 1), dtype=bool)
+        self.goal_sets = np.zeros((size, self.goal_pad + 1), dtype=bool)
+        self.mood_tokens = np.zeros((size, len(self.tokens)), dtype=bool)
+        self.goal_tokens = np.zeros((size, len(self.tokens)), dtype=bool)
+        for row, features in enumerate(self._features):
+            mood_idx = [self.moods.index[mood] for mood in features.moods]
+            goal_idx = [self.goals.index[goal] for goal in features.goals]
+            self.mood_positions[row, : len(mood_idx)] = mood_idx
+            self.goal_positions[row, : len(goal_idx)] = goal_idx
+            self.mood_sets[row, mood_idx] = True
+            self.goal_sets[row, goal_idx] = True
+            self.mood_tokens[row, [self.tokens.index[t] for t in features.mood_tokens]] = True
+            self.goal_tokens[row, [self.tokens.index[t] for t in features.goal_tokens]] = True
+        self.has_mood_tokens = self.mood_tokens.any(axis=1)
+        self.has_goal_tokens = self.goal_tokens.any(axis=1)
+        self.ids = np.array(self._ids, dtype=np.int64)
+        self._dirty = False
+
+
+class VectorizedRecommendationService(MLRecommendationService):
+    """Та же модель, что и MLRecommendationService, но счёт считается батчем в numpy"""
+
+    def __init__(self, snapshot: JsonStorage | None = None) -> None:
+        if np is None:
+            raise RuntimeError("VectorizedRecommendationService requires numpy")
+        super().__init__(snapshot=snapshot)
+        self._matrix = QuestMatrix()
+
+    def _overlap(
+        self, tokens: frozenset[str], matrix: "np.ndarray", has_tokens: "np.ndarray", rows: "np.ndarray"
+    ) -> "np.ndarray":
+        if not tokens:
+            return np.zeros(len(rows))
+        columns = [self._matrix.tokens.index[t] for t in tokens if t in self._matrix.tokens.index]
+        shared = matrix[np.ix_(rows, columns)].sum(axis=1) if columns else np.zeros(len(rows))
+        return np.where(has_tokens[rows], shared / max(1, len(tokens)), 0.0)
+
+    def _weights(self, vocabulary: _Vocabulary, weights: dict[str, float]) -> "np.ndarray":
+        values = np.zeros(len(vocabulary) + 1)
+        for key, column in vocabulary.index.items():
+            values[column] = weights.get(key, 0.0)
+        return values
+
+    def _counts(self, ids: "np.ndarray") -> "np.ndarray":
+        if not self._quest_counts or not len(ids):
+            return np.zeros(len(ids))
+        known = np.array(sorted(self._quest_counts), dtype=np.int64)
+        values = np.array([self._quest_counts[key] for key in known.tolist()], dtype=float)
+        positions = np.minimum(np.searchsorted(known, ids), len(known) - 1)
+        return np.where(known[positions] == ids, values[positions], 0.0)
+
+    def _score_candidates(
+        self, quests: Iterable[Quest], params: UserParams
+    ) -> tuple[list[Quest], "np.ndarray"]:
+        candidates = [quest for quest in quests if quest.walk_type == params.walk_type]
+        matrix = self._matrix
+        rows = matrix.rows_for(candidates, self._features_for)
+        scores = np.zeros(len(rows))
+        if not len(rows):
+            return candidates, scores
+        scores += self._overlap(
+            self._tokenize(params.mood), matrix.mood_tokens, matrix.has_mood_tokens, rows
+        ) * 2.0
+        scores += self._overlap(
+            self._tokenize(params.goal), matrix.goal_tokens, matrix.has_goal_tokens, rows
+        ) * 2.0
+        mood_column = matrix.moods.get(params.mood.lower())
+        if mood_column is not None:
+            scores += np.where(matrix.mood_sets[rows, mood_column], 1.5, 0.0)
+        goal_column = matrix.goals.get(params.goal.lower())
+        if goal_column is not None:
+            scores += np.where(matrix.goal_sets[rows, goal_column], 1.5, 0.0)
+        # по позициям, чтобы порядок сложений (и округление) совпадал с ML-ранжировкой
+        mood_weights = self._weights(matrix.moods, self._mood_weights)
+        for position in range(matrix.mood_positions.shape[1]):
+            scores += mood_weights[matrix.mood_positions[rows, position]] * 0.2
+        goal_weights = self._weights(matrix.goals, self._goal_weights)
+        for position in range(matrix.goal_positions.shape[1]):
+            scores += goal_weights[matrix.goal_positions[rows, position]] * 0.2
+        scores -= self._counts(matrix.ids[rows]) * 1.0
+        return candidates, scores
+
+    @traced("vector_ranking.score")
+    def score(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> list[tuple[float, Quest]]:
+        self._prepare(history)
+        candidates, scores = self._score_candidates(quests, params)
+        return list(zip(scores.tolist(), candidates))
+
+    @traced("vector_ranking.rank")
+    def rank(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> list[Quest]:
+        self._prepare(history)
+        candidates, scores = self._score_candidates(quests, params)
+        order = np.argsort(-scores, kind="stable")
+        return [candidates[index] for index in order.tolist()]
+
+    def iter_rank(
+        self,
+        quests: Iterable[Quest],
+        history: Iterable[HistoryEntry] | HistorySource | None,
+        params: UserParams,
+    ) -> Iterator[Quest]:
+        """Порядок как у rank, но пачками через np.partition вместо полной сортировки"""
+        self._prepare(history)
+        candidates, scores = self._score_candidates(quests, params)
+        negated = -scores
+        remaining = np.arange(len(candidates))
+        batch = 16
+        while remaining.size:
+            values = negated[remaining]
+            size = min(batch, remaining.size)
+            threshold = np.partition(values, size - 1)[size - 1]
+            # все равные порогу попадают в пачку, поэтому порядок совпадает со стабильной сортировкой
+            taken = remaining[values <= threshold]
+            remaining = remaining[values > threshold]
+            for index in taken[np.argsort(negated[taken], kind="stable")].tolist():
+                yield candidates[index]
+            batch *= 2
+
+
+__all__ = ["QuestMatrix", "VectorizedRecommendationService"]
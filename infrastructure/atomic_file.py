@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from contextlib import suppress
+import os
+from pathlib import Path
+import tempfile
+from typing import BinaryIO, Callable
+
+
+def fsync_directory(directory: str | Path) -> None:
+    """fsync каталога, чтобы переименование пережило сбой питания (где это поддерживается)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str | Path, write: Callable[[BinaryIO], None]) -> None:
+    """Запись через временный файл в том же каталоге, fsync и os.replace.
+
+    Читатель видит либо старый, либо новый файл целиком, но не частично
+    записанный; после сбоя на месте остаётся старая версия
+    """
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+    try:
+        try:
+            mode = target.stat().st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_name, mode)
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_name, target)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+    fsync_directory(target.parent)
+
+
+__all__ = ["atomic_write", "fsync_directory"]
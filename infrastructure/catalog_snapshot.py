@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+import mmap
+from pathlib import Path
+import pickle
+import struct
+from typing import Any, BinaryIO
+
+from infrastructure.atomic_file import atomic_write
+
+SnapshotKey = tuple[str, str, str]
+
+_FOOTER = struct.Struct("<Q8s")
+
+
+class CatalogSnapshot:
+    """Скомпилированный каталог заданий, который читается через mmap.
+
+    Файл (в порядке байтов машины, это кэш рядом с quests.json): записи заданий (pickle, каждая отдельно), таблица смещений записей,
+    отсортированные id с номерами записей, списки номеров записей по ключам
+    поиска и в конце — небольшой заголовок с сигнатурой исходного
+    quests.json. Открытие читает только заголовок, поэтому не зависит от
+    размера каталога; записи разбираются по мере обращения
+    """
+
+    MAGIC = b"WALKIECS"
+    FORMAT = 1
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._map: mmap.mmap | None = None
+        self._views: list[memoryview] = []
+        self._header: dict[str, Any] = {}
+
+    @property
+    def version(self) -> str:
+        return self._header["version"]
+
+    def __len__(self) -> int:
+        return self._header["count"]
+
+    def open(self, source_signature: tuple[int, ...]) -> bool:
+        """Открыть снимок; False, если его нет или он собран из другой версии quests.json"""
+        self.close()
+        try:
+            file = self.path.open("rb")
+        except FileNotFoundError:
+            return False
+        # mmap держит свою копию дескриптора, так что файл можно закрыть сразу
+        with file:
+            try:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # пустой файл
+                return False
+        self._map = mapped
+        try:
+            header_offset, magic = _FOOTER.unpack_from(mapped, len(mapped) - _FOOTER.size)
+            header = pickle.loads(mapped[header_offset : len(mapped) - _FOOTER.size])
+        except (struct.error, pickle.UnpicklingError, EOFError, ValueError):
+            self.close()
+            return False
+        if (
+            magic != self.MAGIC
+            or header.get("format") != self.FORMAT
+            or tuple(header.get("source_signature", ())) != tuple(source_signature)
+        ):
+            self.close()
+            return False
+        self._header = header
+        self._offsets = self._view("offsets")
+        self._ids = self._view("ids")
+        self._id_positions = self._view("id_positions")
+        self._postings = self._view("postings", "i")
+        return True
+
+    def opened(self, source_signature: tuple[int, ...]) -> CatalogSnapshot | None:
+        """Новый открытый экземпляр того же файла (или None, как у open).
+
+        Сам self не трогается, поэтому уже открытые экземпляры продолжают
+        работать, пока на них есть ссылки; mmap закрывается вместе с последней
+        """
+        snapshot = CatalogSnapshot(str(self.path))
+        return snapshot if snapshot.open(source_signature) else None
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._header = {}
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def record(self, position: int) -> dict[str, Any]:
+        return pickle.loads(self._map[self._offsets[position] : self._offsets[position + 1]])
+
+    def positions(self, key: SnapshotKey) -> list[int]:
+        start, count = self._header["keys"].get(key, (0, 0))
+        return self._postings[start : start + count].tolist()
+
+    def position_of(self, quest_id: int) -> int | None:
+        index = bisect_left(self._ids, quest_id)
+        if index < len(self._ids) and self._ids[index] == quest_id:
+            return self._id_positions[index]
+        return None
+
+    def ids(self) -> list[int]:
+        return self._ids.tolist()
+
+    def _view(self, name: str, fmt: str = "q") -> memoryview:
+        start, end = self._header["sections"][name]
+        view = memoryview(self._map)[start:end].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def save(
+        self,
+        source_signature: tuple[int, ...],
+        version: str,
+        records: list[Any],
+        keys: dict[SnapshotKey, list[int]],
+        ids: dict[int, int],
+    ) -> None:
+        """Собрать снимок атомарно.
+
+        records — сырые записи заданий, keys — номера записей по ключу поиска,
+        ids — id задания -> номер записи
+        """
+        blobs = [pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL) for record in records]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        sorted_ids = sorted(ids)
+        postings: list[int] = []
+        key_table = {}
+        for key, positions in keys.items():
+            key_table[key] = (len(postings), len(positions))
+            postings.extend(positions)
+
+        def write(file: BinaryIO) -> None:
+            sections: dict[str, tuple[int, int]] = {}
+
+            def section(name: str, payload: bytes) -> None:
+                file.write(b"\0" * (-file.tell() % 8))
+                start = file.tell()
+                file.write(payload)
+                sections[name] = (start, file.tell())
+
+            # записи лежат с начала файла, так что смещения в offsets абсолютные
+            file.write(b"".join(blobs))
+            section("offsets", array("q", offsets).tobytes())
+            section("ids", array("q", sorted_ids).tobytes())
+            section("id_positions", array("q", (ids[key] for key in sorted_ids)).tobytes())
+            section("postings", array("i", postings).tobytes())
+            header = {
+                "format": self.FORMAT,
+                "source_signature": tuple(source_signature),
+                "version": version,
+                "count": len(records),
+                "keys": key_table,
+                "sections": sections,
+            }
+            header_offset = file.tell()
+            file.write(pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL))
+            file.write(_FOOTER.pack(header_offset, self.MAGIC))
+
+        atomic_write(self.path, write)
+
+
+__all__ = ["CatalogSnapshot"]
@@ -1,22 +1,93 @@
 from __future__ import annotations
 
-from typing import Any
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+from typing import Any, Iterable, Iterator
 
 
 class DatabaseStorage:
-    """Место для ДБ для хранения фотографий"""
+    """SQLite-хранилище (stdlib sqlite3, режим WAL)"""
 
     def __init__(self, dsn: str) -> None:
         self.dsn = dsn
+        self._connection: sqlite3.Connection | None = None
+        self._depth = 0
 
-    def connect(self) -> None:
-        """инициаоизация соединения"""
-        raise NotImplementedError("Database connection is not implemented yet :(")
+    @property
+    def database(self) -> str:
+        """Путь к файлу БД без префикса sqlite:///"""
+        return self.dsn.removeprefix("sqlite:///")
+
+    def connect(self) -> sqlite3.Connection:
+        """инициализация соединения (одно на хранилище)"""
+        if self._connection is None:
+            if self.database != ":memory:":
+                Path(self.database).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.database,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
 
     def fetch(self, query: str, parameters: tuple[Any, ...] | None = None) -> list[dict[str, Any]]:
         """запуск SELECT"""
-        raise NotImplementedError("Database queries are not implemented yet :(")
+        cursor = self.connect().execute(query, parameters or ())
+        return [dict(row) for row in cursor.fetchall()]
+
+    def iterate(self, query: str, parameters: tuple[Any, ...] | None = None) -> Iterator[dict[str, Any]]:
+        """SELECT построчно через курсор, без fetchall"""
+        cursor = self.connect().execute(query, parameters or ())
+        try:
+            for row in cursor:
+                yield dict(row)
+        finally:
+            cursor.close()
 
     def execute(self, query: str, parameters: tuple[Any, ...] | None = None) -> None:
         """запуск INSERT/UPDATE/DELETE"""
-        raise NotImplementedError("Database writes are not implemented yet :(")
+        self.connect().execute(query, parameters or ())
+
+    def executemany(self, query: str, rows: Iterable[tuple[Any, ...]]) -> None:
+        """один подготовленный запрос на много строк"""
+        self.connect().executemany(query, rows)
+
+    def executescript(self, script: str) -> None:
+        self.connect().executescript(script)
+
+    @contextmanager
+    def transaction(self) -> Iterator[DatabaseStorage]:
+        """BEGIN IMMEDIATE ... COMMIT, откат при исключении.
+
+        Вложенный вызов открывает SAVEPOINT внутри уже идущей транзакции
+        """
+        connection = self.connect()
+        if self._depth:
+            savepoint = f"walkie_{self._depth}"
+            begin, commit = f"SAVEPOINT {savepoint}", f"RELEASE {savepoint}"
+            rollback = (f"ROLLBACK TO {savepoint}", f"RELEASE {savepoint}")
+        else:
+            begin, commit, rollback = "BEGIN IMMEDIATE", "COMMIT", ("ROLLBACK",)
+        connection.execute(begin)
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            for statement in rollback:
+                connection.execute(statement)
+            raise
+        else:
+            connection.execute(commit)
+        finally:
+            self._depth -= 1
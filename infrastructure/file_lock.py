@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # не POSIX — блокировка между процессами недоступна
+    fcntl = None
+
+# блокировки, которые уже держит текущий поток: повторный locked() их не берёт
+_held = threading.local()
+
+
+@contextmanager
+def locked(path: str | Path, exclusive: bool = True) -> Iterator[None]:
+    """Межпроцессная блокировка через flock на соседнем файле <path>.lock.
+
+    Внутри уже взятой блокировки того же файла в том же потоке вложенный вызов
+    ничего не делает (иначе второй flock на новом дескрипторе ждал бы сам себя)
+    """
+    lock_path = Path(str(path) + ".lock")
+    held = _held.__dict__.setdefault("paths", set())
+    key = str(lock_path.absolute())
+    if key in held:
+        yield
+        return
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+__all__ = ["locked"]
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+from infrastructure.jsonl_storage import JsonLinesStorage
+
+
+class HistoryIndex:
+    """Индекс id -> смещение строки для журнала JSON Lines.
+
+    Помимо смещения хранит краткую сводку записи (дата, тип, статус, балл),
+    чтобы список истории фильтровался без чтения журнала. Хранится в файле
+    рядом с журналом (<история>.idx) и, как журнал, только дописывается: по
+    строке на запись и после каждой пачки строка-итог с длиной уже
+    проиндексированной части. При обращении дочитываются только новые строки
+    индекса и хвост журнала после итога; пачка без итога (оборванная запись)
+    не учитывается. Если журнал перезаписан или укорочен, индекс строится
+    заново и файл переписывается целиком. fsync после дописывания не нужен:
+    потерянный хвост индекса просто дочитается из журнала
+    """
+
+    VERSION = 3
+    SUMMARY_FIELDS = ("date", "walk_type", "status", "score")
+
+    def __init__(self, storage: JsonLinesStorage, path: str | None = None) -> None:
+        self.storage = storage
+        self.path = Path(path) if path else storage.path.with_name(storage.path.name + ".idx")
+        self._offsets: dict[int, int] = {}
+        self._summaries: dict[int, tuple] = {}
+        self._covered = 0
+        self._last: tuple[int, int] | None = None
+        self._loaded = False
+        # сколько байт файла индекса уже прочитано и какой это файл (inode)
+        self._index_size = 0
+        self._index_inode: int | None = None
+        # файла нет, он старого формата или с оборванным хвостом — дописывать нельзя
+        self._rewrite = True
+
+    def offset_of(self, entry_id: int) -> int | None:
+        self.refresh()
+        return self._offsets.get(entry_id)
+
+    def ids(self) -> list[int]:
+        """id записей в порядке журнала"""
+        self.refresh()
+        return list(self._offsets)
+
+    def mark(self) -> tuple[int, int]:
+        """(число записей, наибольший id) без чтения журнала"""
+        self.refresh()
+        return len(self._offsets), max(self._offsets, default=0)
+
+    def summaries(self) -> list[dict]:
+        """Сводки записей в порядке журнала: id и SUMMARY_FIELDS"""
+        self.refresh()
+        return [
+            {"id": entry_id, **dict(zip(self.SUMMARY_FIELDS, summary))}
+            for entry_id, summary in self._summaries.items()
+        ]
+
+    def refresh(self) -> None:
+        if not self._loaded:
+            self._read_index()
+            self._loaded = True
+        if self._journal_size() == self._covered and self._still_valid():
+            return
+        with locked(self.path):
+            # другой процесс мог уже дописать индекс до нужного места
+            self._read_index()
+            if self._journal_size() < self._covered or not self._still_valid():
+                self._reset()
+                self._rewrite = True
+            size = self._journal_size()
+            if size == self._covered and not self._rewrite:
+                return
+            records = self._scan_journal() if size > self._covered else []
+            self._write(records)
+
+    def _journal_size(self) -> int:
+        signature = self.storage.signature()
+        return signature[1] if signature else 0
+
+    def _scan_journal(self) -> list[list]:
+        """Дочитать журнал после covered; вернуть строки индекса для новых записей"""
+        records = []
+        for offset, line in self.storage.iter_lines(self._covered):
+            if line.strip():
+                record = json.loads(line)
+                entry_id = int(record["id"])
+                # при повторе id get_entry, как и обход журнала, отдаёт первую запись
+                if entry_id not in self._offsets:
+                    summary = (
+                        record["date"],
+                        record["walk_type"],
+                        record.get("status", "unknown"),
+                        int(record.get("score", 0)),
+                    )
+                    self._offsets[entry_id] = offset
+                    self._summaries[entry_id] = summary
+                    records.append([entry_id, offset, *summary])
+                self._last = (offset, entry_id)
+            self._covered = offset + len(line)
+        return records
+
+    def _still_valid(self) -> bool:
+        """Проверка, что проиндексированная часть журнала не переписана"""
+        if self._last is None:
+            return self._covered == 0
+        offset, entry_id = self._last
+        try:
+            record = self.storage.read_at(offset)
+        except (OSError, ValueError):
+            return False
+        return record is not None and int(record.get("id", -1)) == entry_id
+
+    def _reset(self) -> None:
+        self._offsets = {}
+        self._summaries = {}
+        self._covered = 0
+        self._last = None
+
+    def _read_index(self) -> None:
+        """Прочитать строки индекса, дописанные после прошлого чтения"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._rewrite = True
+            return
+        if stat.st_ino != self._index_inode or stat.st_size < self._index_size:
+            # файл переписан (перестроен другим процессом) — читаем с начала
+            self._reset()
+            self._index_size = 0
+            self._index_inode = stat.st_ino
+        if stat.st_size == self._index_size:
+            return
+        pending: list[list] = []
+        position = self._index_size
+        with self.path.open("rb") as file:
+            file.seek(position)
+            if position == 0:
+                header = file.readline()
+                try:
+                    valid = json.loads(header).get("version") == self.VERSION
+                except (ValueError, AttributeError):
+                    valid = False
+                if not valid or not header.endswith(b"\n"):
+                    self._rewrite = True
+                    return
+                position = self._index_size = len(header)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    break
+                position += len(line)
+                if isinstance(item, list):
+                    pending.append(item)
+                    continue
+                # строка-итог: пачка перед ней записана целиком
+                for entry_id, offset, *summary in pending:
+                    if entry_id not in self._offsets:
+                        self._offsets[entry_id] = offset
+                        self._summaries[entry_id] = tuple(summary)
+                pending = []
+                self._covered = int(item["covered"])
+                self._last = tuple(item["last"]) if item.get("last") else None
+                self._index_size = position
+        # после оборванной пачки дописывать нельзя: строки склеились бы с ней
+        self._rewrite = self._index_size != stat.st_size
+
+    def _write(self, records: list[list]) -> None:
+        trailer = {"covered": self._covered, "last": list(self._last) if self._last else None}
+        if self._rewrite:
+            lines = [{"version": self.VERSION}]
+            lines.extend(
+                [entry_id, offset, *self._summaries[entry_id]]
+                for entry_id, offset in self._offsets.items()
+            )
+        else:
+            lines = list(records)
+        lines.append(trailer)
+        payload = b"".join(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n" for line in lines)
+        if self._rewrite:
+            atomic_write(self.path, lambda file: file.write(payload))
+            stat = self.path.stat()
+            self._index_inode, self._index_size = stat.st_ino, stat.st_size
+            self._rewrite = False
+            return
+        with self.path.open("ab") as file:
+            file.write(payload)
+        self._index_size += len(payload)
+
+
+__all__ = ["HistoryIndex"]
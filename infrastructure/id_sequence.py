@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+
+
+class IdSequence:
+    """Монотонный счётчик id в файле рядом с историей.
+
+    В файле хранится следующий свободный id. Выдача и сдвиг идут под
+    межпроцессной блокировкой, поэтому две сессии с общим каталогом данных
+    не получат один и тот же id
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def allocate(self, initial: Callable[[], int]) -> int:
+        """Выдать следующий id; initial() считает стартовое значение, если файла ещё нет"""
+        with locked(self.path):
+            value = self._read()
+            if value is None:
+                value = initial()
+            self._write(value + 1)
+        return value
+
+    def observe(self, entry_id: int) -> None:
+        """Сдвинуть счётчик за id, записанный в обход allocate (импорт, ручной id)"""
+        with locked(self.path):
+            value = self._read()
+            # без файла счётчик ещё не начат: allocate посчитает его по истории с этой записью
+            if value is None or value > entry_id:
+                return
+            self._write(entry_id + 1)
+
+    def _read(self) -> int | None:
+        try:
+            return int(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            # файла нет или он повреждён — значение пересчитается из истории
+            return None
+
+    def _write(self, value: int) -> None:
+        atomic_write(self.path, lambda file: file.write(str(value).encode("ascii")))
+
+
+__all__ = ["IdSequence"]
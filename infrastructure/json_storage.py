@@ -1,21 +1,148 @@
+from contextlib import nullcontext
 import json
 from pathlib import Path
-from typing import Any
+from typing import Any, ContextManager, Iterator
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+from infrastructure.tracing import traced
 
 
 class JsonStorage:
-    def __init__(self, path: str) -> None:
+    """JSON-файл с кэшем разобранного документа.
+
+    Документ перечитывается только при смене сигнатуры файла, поэтому
+    результат read_json общий для всех вызовов и его нельзя менять на месте.
+    Запись атомарная (временный файл + os.replace); с lock=True запись и
+    append_json идут под flock, чтобы процессы с общим каталогом не теряли
+    изменения друг друга
+    """
+
+    def __init__(self, path: str, lock: bool = False) -> None:
         self.path = Path(path)
+        self.lock = lock
+        self._cache: Any = None
+        self._cached_signature: tuple[int, ...] | None = None
+        # последняя записанная версия, ещё не разобранная в _cache
+        self._written: bytes | None = None
 
+    def signature(self) -> tuple[int, ...] | None:
+        """(mtime_ns, size, inode) файла или None, если файла ещё нет"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def invalidate(self) -> None:
+        """Сбросить кэш, следующий read_json прочитает файл заново"""
+        self._cache = None
+        self._cached_signature = None
+        self._written = None
+
+    @traced("json_storage.read_json")
     def read_json(self, default: Any) -> Any:
-        if not self.path.exists():
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            self.write_json(default)
+        signature = self.signature()
+        if signature is None:
+            # без блокировки: read_json вызывается и из append_json, уже под ней
+            self._write(default)
             return default
+        if signature == self._cached_signature:
+            return self._cached()
         with self.path.open("r", encoding="utf-8") as file:
-            return json.load(file)
+            data = json.load(file)
+        self._cache = data
+        self._cached_signature = signature
+        return data
+
+    def _cached(self) -> Any:
+        if self._written is not None:
+            self._cache = json.loads(self._written)
+            self._written = None
+        return self._cache
 
+    @traced("json_storage.write_json")
     def write_json(self, data: Any) -> None:
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        with self.path.open("w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+        with self._locked():
+            self._write(data)
+
+    def _write(self, data: Any) -> None:
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        self.invalidate()
+        atomic_write(self.path, lambda file: file.write(payload))
+        # os.replace даёт файлу новый inode, так что сигнатура однозначно соответствует data.
+        # В кэш идёт не сам data, а записанный текст: вызывающий может дальше менять свой объект
+        self._written = payload
+        self._cached_signature = self.signature()
+
+    def _locked(self) -> ContextManager[None]:
+        return locked(self.path) if self.lock else nullcontext()
+
+    def iter_json(self, chunk_size: int = 1 << 16) -> Iterator[Any]:
+        """Элементы JSON-массива по одному, без загрузки всего файла.
+
+        Если документ уже в кэше, обходится он; иначе файл разбирается
+        инкрементально через raw_decode и в кэш не попадает
+        """
+        signature = self.signature()
+        if signature is None:
+            return
+        if signature == self._cached_signature:
+            yield from self._cached()
+            return
+        decoder = json.JSONDecoder()
+        with self.path.open("r", encoding="utf-8") as file:
+            buffer = ""
+            position = 0
+            exhausted = False
+            opened = False
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position == len(buffer):
+                    if exhausted:
+                        if opened:
+                            raise ValueError(f"Unterminated JSON array in {self.path}")
+                        return
+                    chunk = file.read(chunk_size)
+                    exhausted = not chunk
+                    buffer, position = buffer[position:] + chunk, 0
+                    continue
+                char = buffer[position]
+                if not opened:
+                    if char != "[":
+                        raise ValueError(f"{self.path} does not contain a JSON array")
+                    opened = True
+                    position += 1
+                    continue
+                if char == "]":
+                    return
+                if char == ",":
+                    position += 1
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    end = -1
+                follow = end
+                while 0 <= follow < len(buffer) and buffer[follow] in " \t\r\n":
+                    follow += 1
+                if end == -1 or follow == len(buffer) or buffer[follow] not in ",]":
+                    # элемент обрезан границей чанка (в том числе число) — дочитываем и разбираем заново
+                    if exhausted:
+                        raise ValueError(f"Malformed JSON array in {self.path}")
+                    chunk = file.read(chunk_size)
+                    exhausted = not chunk
+                    buffer, position = buffer[position:] + chunk, 0
+                    continue
+                yield item
+                position = end
+                if position > chunk_size:
+                    buffer, position = buffer[position:], 0
+
+    def append_json(self, item: Any) -> None:
+        """Добавить элемент в JSON-массив (перезаписывает весь файл)"""
+        with self._locked():
+            data = list(self.read_json(default=[]))
+            data.append(item)
+            self._write(data)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from contextlib import nullcontext
+import json
+import os
+from pathlib import Path
+from typing import Any, ContextManager, Iterator
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+from infrastructure.tracing import traced
+
+
+class JsonLinesStorage:
+    """Журнал в формате JSON Lines: одна запись на строку, запись только дописыванием.
+
+    Интерфейс совпадает с JsonStorage (read_json/write_json/append_json),
+    так что WalkStorage может работать с любым из них. Полная перезапись
+    атомарная; с lock=True запись идёт под flock, чтобы дописывание одного
+    процесса не приняли за недописанный хвост в другом
+    """
+
+    def __init__(self, path: str, lock: bool = False) -> None:
+        self.path = Path(path)
+        self.lock = lock
+        self._cache: list[Any] | None = None
+        self._cached_signature: tuple[int, ...] | None = None
+
+    def signature(self) -> tuple[int, ...] | None:
+        """(mtime_ns, size, inode) файла или None, если файла ещё нет"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def invalidate(self) -> None:
+        """Сбросить кэш, следующий read_json прочитает файл заново"""
+        self._cache = None
+        self._cached_signature = None
+
+    @traced("jsonl_storage.read_json")
+    def read_json(self, default: Any) -> Any:
+        signature = self.signature()
+        if signature is None:
+            self.write_json(default)
+            return default
+        if signature == self._cached_signature:
+            return self._cache
+        records = list(self._iter_file())
+        self._cache = records
+        self._cached_signature = signature
+        return records
+
+    def iter_json(self) -> Iterator[Any]:
+        """Записи журнала по одной, без загрузки всего файла в память"""
+        signature = self.signature()
+        if signature is None:
+            return
+        if signature == self._cached_signature:
+            yield from self._cache
+            return
+        yield from self._iter_file()
+
+    def read_at(self, offset: int) -> Any | None:
+        """Одна запись по смещению строки (см. append_json); None для недописанной строки"""
+        with self.path.open("rb") as file:
+            file.seek(offset)
+            line = file.readline()
+        if not line.endswith(b"\n"):
+            return None
+        return json.loads(line)
+
+    def iter_lines(self, start: int = 0) -> Iterator[tuple[int, bytes]]:
+        """(смещение, строка) для целых строк начиная с позиции start"""
+        with self.path.open("rb") as file:
+            file.seek(start)
+            offset = start
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                yield offset, line
+                offset += len(line)
+
+    def _iter_file(self) -> Iterator[Any]:
+        # недописанная строка после сбоя в iter_lines не попадает — её ещё нет в журнале
+        for _, line in self.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+    @traced("jsonl_storage.write_json")
+    def write_json(self, data: Any) -> None:
+        """Полная перезапись журнала (миграции, компактизация)"""
+        self.invalidate()
+        with self._locked():
+            atomic_write(self.path, lambda file: file.writelines(map(self._encode, data)))
+
+    @traced("jsonl_storage.append_json")
+    def append_json(self, record: Any) -> int:
+        """Дописать запись с fsync и вернуть её смещение в файле"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.invalidate()
+        with self._locked(), self.path.open("ab") as file:
+            offset = self._repair_tail(file)
+            file.write(self._encode(record))
+            file.flush()
+            os.fsync(file.fileno())
+        return offset
+
+    def migrate_from(self, legacy_path: str) -> bool:
+        """Однократный перенос истории из JSON-массива; True, если перенос был"""
+        legacy = Path(legacy_path)
+        if self.path.exists() or not legacy.exists():
+            return False
+        with legacy.open("r", encoding="utf-8") as file:
+            records = json.load(file)
+        self.write_json(records)
+        return True
+
+    def _locked(self) -> ContextManager[None]:
+        return locked(self.path) if self.lock else nullcontext()
+
+    @staticmethod
+    def _encode(record: Any) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _repair_tail(self, file: Any) -> int:
+        """Отрезать недописанную последнюю строку, вернуть позицию для записи"""
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        with self.path.open("rb") as reader:
+            reader.seek(size - 1)
+            if reader.read(1) == b"\n":
+                return size
+            position = size
+            chunk_size = 4096
+            while position > 0:
+                start = max(0, position - chunk_size)
+                reader.seek(start)
+                chunk = reader.read(position - start)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+        file.truncate(position)
+        return position
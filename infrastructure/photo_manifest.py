@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Callable
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+
+
+class PhotoManifest:
+    """manifest.json в каталоге прогулки: по записи на каждое её фото.
+
+    Запись — путь, номер задания, исходное имя, размер, mtime, SHA-256 и подпись.
+    Список фото прогулки читается из одного маленького файла вместо обхода
+    каталогов; изменения идут под flock и записываются атомарно
+    """
+
+    FILENAME = "manifest.json"
+    VERSION = 1
+
+    def __init__(self, entry_dir: Path) -> None:
+        self.path = entry_dir / self.FILENAME
+
+    def exists(self) -> bool:
+        """Есть ли читаемый манифест: повреждённый считается отсутствующим"""
+        return self.load() is not None
+
+    def read(self) -> list[dict[str, Any]]:
+        return self.load() or []
+
+    def load(self) -> list[dict[str, Any]] | None:
+        """Записи манифеста или None, если его нет или он повреждён"""
+        try:
+            data = json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # обрезанный или испорченный файл — verify-photos --rebuild перепишет его
+            return None
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return None
+        photos = data.get("photos")
+        return photos if isinstance(photos, list) else None
+
+    def add(self, record: dict[str, Any]) -> None:
+        self._update(lambda records: [*records, record])
+
+    def remove(self, file_path: str) -> None:
+        self._update(lambda records: [item for item in records if item["file_path"] != file_path])
+
+    def replace(self, records: list[dict[str, Any]]) -> None:
+        self._update(lambda _: records)
+
+    def _update(self, change: Callable[[list[dict[str, Any]]], list[dict[str, Any]]]) -> None:
+        with locked(self.path):
+            records = change(self.read())
+            payload = json.dumps(
+                {"version": self.VERSION, "photos": records}, ensure_ascii=False
+            ).encode("utf-8")
+            atomic_write(self.path, lambda file: file.write(payload))
+
+
+__all__ = ["PhotoManifest"]
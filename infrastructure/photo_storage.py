@@ -1,54 +1,336 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import suppress
+from dataclasses import dataclass, field
 from datetime import datetime
+import hashlib
+import json
+import os
 from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+import re
+from typing import Any, Callable
+
+from infrastructure.atomic_file import atomic_write
+from infrastructure.file_lock import locked
+from infrastructure.photo_manifest import PhotoManifest
+
+try:
+    import fcntl
+except ImportError:  # не POSIX — reflink недоступен
+    fcntl = None
+
+# ioctl FICLONE из linux/fs.h: копия-ссылка на те же блоки (btrfs, xfs, overlayfs поверх них)
+_FICLONE = 0x40049409
+_CHUNK = 1 << 20
+LINK_MODES = ("copy", "reflink", "hardlink")
+_TIMESTAMP_PREFIX = re.compile(r"^\d{8}_\d{6}_")
+
+
+def _file_sha256(path: Path) -> str:
+    with path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def _recorded_digests(manifest: PhotoManifest) -> dict[str, str]:
+    return {record["file_path"]: record["sha256"] for record in manifest.read()}
+
+
+def _newest_mtime(directory: Path) -> float:
+    newest = directory.stat().st_mtime
+    for root, dirs, files in os.walk(directory):
+        for name in [*dirs, *files]:
+            with suppress(FileNotFoundError):
+                newest = max(newest, os.lstat(os.path.join(root, name)).st_mtime)
+    return newest
+
+
+def _same_inode(path: Path, stat: os.stat_result) -> bool:
+    with suppress(FileNotFoundError):
+        other = path.stat()
+        return (other.st_dev, other.st_ino) == (stat.st_dev, stat.st_ino)
+    return False
+
+
+def _reflink(source: Path, target: Path) -> bool:
+    if fcntl is None:
+        return False
+    with source.open("rb") as src, target.open("wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def _copy_file_range(src: int, dst: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src, dst, size - offset, offset, offset)
+        if copied == 0:
+            raise OSError("copy_file_range stopped before the end of file")
+        offset += copied
+
+
+def _sendfile(src: int, dst: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst, src, offset, size - offset)
+        if sent == 0:
+            raise OSError("sendfile stopped before the end of file")
+        offset += sent
+
+
+_KERNEL_COPIES = [
+    copy
+    for name, copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile))
+    if hasattr(os, name)
+]
+
+
+def copy_file(source: Path, target: Path) -> None:
+    """Копия без буфера на весь файл: copy_file_range, затем sendfile, затем по 1 МиБ"""
+    with source.open("rb") as src, target.open("wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        for copy in _KERNEL_COPIES:
+            try:
+                copy(src.fileno(), dst.fileno(), size)
+                return
+            except OSError:
+                # разные ФС, старое ядро, не поддерживаемый тип файла — следующий способ с начала
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, _CHUNK)
 
 
 @dataclass
 class FileSystemPhotoStorage:
-    """Хранилище фоток (локально пока что)"""
+    """Хранилище фоток (локально пока что)
+
+    link_mode: copy — обычная копия, reflink — копия-ссылка на те же блоки, если
+    ФС умеет (иначе копия), hardlink — жёсткая ссылка, если исходник на той же ФС
+    (иначе копия; изменение исходника затронет и сохранённое фото)
+    """
 
     data_dir: Path
     storage_name: str
+    link_mode: str = "copy"
+    workers: int = 0
 
-    def __init__(self, data_dir: str, storage_name: str) -> None:
+    def __init__(
+        self,
+        data_dir: str,
+        storage_name: str,
+        link_mode: str = "copy",
+        workers: int = 0,
+        max_pending: int | None = None,
+    ) -> None:
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown photo link mode: {link_mode}")
         self.data_dir = Path(data_dir)
         self.storage_name = storage_name
+        self.link_mode = link_mode
+        # workers=0 — копия прямо в вызове; иначе очередь из max_pending копий на пул потоков
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="walkie-photo") if workers else None
+        self._slots = threading.BoundedSemaphore(max_pending or workers * 4 or 1)
+        self._pending: set[Future] = set()
+        self._pending_lock = threading.Lock()
 
     @property
     def base_dir(self) -> Path:
         return self.data_dir / "photos" / self.storage_name
 
+    def _target_path(self, entry_id: int, task_id: int, filename: str) -> Path:
+        safe_name = Path(filename).name or "photo.jpg"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        target_dir = self.base_dir / str(entry_id) / f"task_{task_id}"
+        target_dir.mkdir(parents=True, exist_ok=True)
+        return target_dir / f"{timestamp}_{safe_name}"
+
+    def _metadata(self, target_path: Path, caption: str | None = None) -> dict[str, str]:
+        relative_path = target_path.relative_to(self.data_dir)
+        metadata = {"file_path": str(relative_path), "storage": self.storage_name}
+        if caption:
+            metadata["caption"] = caption
+        return metadata
+
     def store_photo(
         self,
         entry_id: int,
         task_id: int,
         filename: str,
         data: bytes,
+        caption: str | None = None,
     ) -> dict[str, str]:
         """Сохранение фото и возврат метаданных для истории"""
-        safe_name = Path(filename).name or "photo.jpg"
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        target_dir = self.base_dir / str(entry_id) / f"task_{task_id}"
-        target_dir.mkdir(parents=True, exist_ok=True)
-        target_path = target_dir / f"{timestamp}_{safe_name}"
+        target_path = self._target_path(entry_id, task_id, filename)
+        metadata = self._metadata(target_path, caption)
+        metadata.update(self._ingest_bytes(data, target_path))
+        self._register(task_id, filename, target_path, metadata)
+        return metadata
+
+    def store_photo_file(
+        self,
+        entry_id: int,
+        task_id: int,
+        source_path: str | Path,
+        filename: str | None = None,
+        caption: str | None = None,
+    ) -> dict[str, str]:
+        """Сохранение фото по пути к файлу, без чтения его в память.
+
+        С пулом потоков метаданные возвращаются сразу со статусом pending; когда
+        копия готова, статус убирается, а при ошибке становится failed с текстом в error
+        """
+        source = Path(source_path)
+        original_name = filename or source.name
+        target_path = self._target_path(entry_id, task_id, original_name)
+        metadata = self._metadata(target_path, caption)
+        if self._executor is None:
+            self._store(source, task_id, original_name, target_path, metadata)
+            return metadata
+        metadata["status"] = "pending"
+        # ограниченная очередь: при переполнении вызывающий ждёт, а не копит задачи в памяти
+        self._slots.acquire()
+        future = self._executor.submit(
+            self._store_async, source, task_id, original_name, target_path, metadata
+        )
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+        return metadata
+
+    def _store(
+        self,
+        source: Path,
+        task_id: int,
+        original_name: str,
+        target_path: Path,
+        metadata: dict[str, str],
+    ) -> None:
+        metadata.update(self._ingest(source, target_path))
+        self._register(task_id, original_name, target_path, metadata)
+
+    def _store_async(
+        self,
+        source: Path,
+        task_id: int,
+        original_name: str,
+        target_path: Path,
+        metadata: dict[str, str],
+    ) -> None:
+        try:
+            self._store(source, task_id, original_name, target_path, metadata)
+        except Exception as exc:
+            metadata["error"] = getattr(exc, "strerror", None) or str(exc)
+            metadata["status"] = "failed"
+        else:
+            del metadata["status"]
+
+    def _ingest(self, source: Path, target_path: Path) -> dict[str, str]:
+        """Положить файл на место target_path; вернуть дополнительные поля метаданных"""
+        # копия собирается во временном файле, чтобы после сбоя не осталось обрезанного фото
+        partial = target_path.with_name(target_path.name + ".part")
+        try:
+            self._place(source, partial)
+            os.replace(partial, target_path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                partial.unlink()
+            raise
+        return {"sha256": _file_sha256(target_path)}
+
+    def _ingest_bytes(self, data: bytes, target_path: Path) -> dict[str, str]:
         target_path.write_bytes(data)
-        relative_path = target_path.relative_to(self.data_dir)
-        return {"file_path": str(relative_path), "storage": self.storage_name}
+        return {"sha256": hashlib.sha256(data).hexdigest()}
+
+    def _finished(self, future: Future) -> None:
+        with self._pending_lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def flush(self) -> None:
+        """Дождаться всех поставленных в очередь копий"""
+        with self._pending_lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def close(self) -> None:
+        """Дождаться копий и остановить пул потоков"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _place(self, source: Path, target: Path) -> None:
+        if self.link_mode == "hardlink":
+            with suppress(OSError):
+                os.link(source, target)
+                return
+        if self.link_mode == "reflink" and _reflink(source, target):
+            return
+        copy_file(source, target)
+
+    def _manifest(self, entry_id: int | str) -> PhotoManifest:
+        return PhotoManifest(self.base_dir / str(entry_id))
+
+    def _record(
+        self, task_id: int, original_name: str, path: Path, sha256: str, caption: str | None
+    ) -> dict[str, Any]:
+        stat = path.stat()
+        record = {
+            "file_path": str(path.relative_to(self.data_dir)),
+            "task_id": task_id,
+            "original_name": original_name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+        }
+        if caption:
+            record["caption"] = caption
+        return record
+
+    def _register(
+        self, task_id: int, original_name: str, target_path: Path, metadata: dict[str, str]
+    ) -> None:
+        entry_id = target_path.relative_to(self.base_dir).parts[0]
+        self._manifest(entry_id).add(
+            self._record(
+                task_id, original_name, target_path, metadata["sha256"], metadata.get("caption")
+            )
+        )
 
     def list_photos(self, entry_id: int, task_id: int) -> list[dict[str, str]]:
-        """Возврат метаданных для уже сохраненных фото"""
+        """Возврат метаданных для уже сохраненных фото (из манифеста прогулки)"""
+        records = self._manifest(entry_id).load()
+        if records is None:
+            return self._scan_photos(entry_id, task_id)
+        photos = []
+        for record in records:
+            if record["task_id"] != task_id:
+                continue
+            metadata = {
+                "file_path": record["file_path"],
+                "storage": self.storage_name,
+                "sha256": record["sha256"],
+            }
+            if record.get("caption"):
+                metadata["caption"] = record["caption"]
+            photos.append(metadata)
+        return photos
+
+    def _scan_photos(self, entry_id: int, task_id: int) -> list[dict[str, str]]:
+        # прогулки, сохранённые до манифестов (verify-photos --rebuild создаст манифест)
         target_dir = self.base_dir / str(entry_id) / f"task_{task_id}"
         if not target_dir.exists():
             return []
         photos = []
         for path in sorted(target_dir.iterdir()):
-            if path.is_file():
-                relative_path = path.relative_to(self.data_dir)
-                photos.append(
-                    {"file_path": str(relative_path), "storage": self.storage_name}
-                )
+            if path.is_file() and path.suffix != ".part":
+                photos.append(self._metadata(path))
         return photos
 
     def delete_photo(self, photo_id: str) -> None:
@@ -56,12 +338,351 @@ class FileSystemPhotoStorage:
         path = Path(photo_id)
         if not path.is_absolute():
             path = self.data_dir / path
-        if path.exists():
-            path.unlink()
+        if not path.exists():
+            return
+        manifest = file_path = None
+        with suppress(ValueError):
+            manifest = self._manifest(path.relative_to(self.base_dir).parts[0])
+            file_path = str(path.relative_to(self.data_dir))
+        digests = _recorded_digests(manifest) if manifest is not None else {}
+        self._unlink(path, digests.get(file_path))
+        if manifest is not None:
+            manifest.remove(file_path)
+
+    def _unlink(self, path: Path, digest: str | None = None) -> int:
+        """Удалить файл фото; вернуть, сколько байт освободилось на диске.
+
+        digest — SHA-256 из манифеста, если он известен
+        """
+        stat = path.stat()
+        path.unlink()
+        # при link_mode=hardlink inode общий с оригиналом и место не освобождается
+        return stat.st_size if stat.st_nlink == 1 else 0
+
+    @property
+    def gc_cursor_path(self) -> Path:
+        return self.base_dir / "gc.cursor"
+
+    def collect_orphans(
+        self,
+        is_live: Callable[[int], bool],
+        grace_seconds: float = 24 * 3600,
+        limit: int = 500,
+        now: float | None = None,
+    ) -> "GcReport":
+        """Удалить фото прогулок, которых нет в истории (например, прерванных без сохранения).
+
+        За вызов просматривается не больше limit каталогов прогулок по возрастанию
+        id, начиная с места, где остановился прошлый вызов (gc.cursor). Каталоги,
+        которые менялись позже чем grace_seconds назад, не трогаются: прогулка
+        может быть ещё не сохранена
+        """
+        report = GcReport()
+        if not self.base_dir.exists():
+            return report
+        deadline = (time.time() if now is None else now) - grace_seconds
+        with locked(self.gc_cursor_path):
+            after = self._read_gc_cursor()
+            entries = sorted(
+                int(item.name)
+                for item in os.scandir(self.base_dir)
+                if item.name.isdigit() and int(item.name) > after and item.is_dir()
+            )
+            batch = entries[: max(1, limit)]
+            for entry_id in batch:
+                report.scanned += 1
+                entry_dir = self.base_dir / str(entry_id)
+                if is_live(entry_id):
+                    continue
+                if _newest_mtime(entry_dir) > deadline:
+                    report.recent += 1
+                    continue
+                report.reclaimed_bytes += self._remove_entry(entry_dir)
+                report.reclaimed_entries.append(entry_id)
+            # дошли до конца дерева — следующий вызов начнёт сначала
+            report.finished = len(batch) == len(entries)
+            self._write_gc_cursor(-1 if report.finished else batch[-1])
+        return report
+
+    def _remove_entry(self, entry_dir: Path) -> int:
+        freed = 0
+        digests = _recorded_digests(PhotoManifest(entry_dir))
+        for root, dirs, files in os.walk(entry_dir, topdown=False):
+            for name in files:
+                path = Path(root, name)
+                if path.parent.name.startswith("task_") and path.suffix != ".part":
+                    freed += self._unlink(path, digests.get(str(path.relative_to(self.data_dir))))
+                else:
+                    stat = path.stat()
+                    path.unlink()
+                    freed += stat.st_size if stat.st_nlink == 1 else 0
+            for name in dirs:
+                os.rmdir(Path(root, name))
+        os.rmdir(entry_dir)
+        return freed
+
+    def _read_gc_cursor(self) -> int:
+        try:
+            return json.loads(self.gc_cursor_path.read_bytes())["after"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return -1
+
+    def _write_gc_cursor(self, after: int) -> None:
+        payload = json.dumps({"after": after}).encode("utf-8")
+        atomic_write(self.gc_cursor_path, lambda file: file.write(payload))
+
+    def verify_manifests(
+        self, rebuild: bool = False, checksums: bool = False, workers: int = 8
+    ) -> "ManifestReport":
+        """Сверить манифесты прогулок с файлами на диске, по прогулке на поток.
+
+        Без checksums сравниваются размер и mtime; с rebuild манифесты с
+        расхождениями (и отсутствующие) пересобираются по диску
+        """
+        report = ManifestReport()
+        if not self.base_dir.exists():
+            return report
+        entries = [path for path in self.base_dir.iterdir() if path.name.isdigit() and path.is_dir()]
+        with ThreadPoolExecutor(max(1, workers), thread_name_prefix="walkie-verify") as executor:
+            for result in executor.map(
+                lambda entry_dir: self._verify_entry(entry_dir, rebuild, checksums), entries
+            ):
+                report.merge(result)
+        return report
+
+    def _verify_entry(self, entry_dir: Path, rebuild: bool, checksums: bool) -> "ManifestReport":
+        report = ManifestReport(entries=1)
+        manifest = PhotoManifest(entry_dir)
+        loaded = manifest.load()
+        recorded = {record["file_path"]: record for record in loaded or []}
+        on_disk = {
+            str(path.relative_to(self.data_dir)): path
+            for task_dir in entry_dir.glob("task_*")
+            for path in task_dir.iterdir()
+            if path.suffix != ".part" and path.is_file()
+        }
+        report.photos = len(on_disk)
+        records = []
+        for file_path, path in sorted(on_disk.items()):
+            record = recorded.get(file_path)
+            if record is None:
+                report.untracked.append(file_path)
+                if rebuild:
+                    task_id = int(path.parent.name.removeprefix("task_"))
+                    original_name = _TIMESTAMP_PREFIX.sub("", path.name)
+                    records.append(
+                        self._record(task_id, original_name, path, _file_sha256(path), None)
+                    )
+                continue
+            stat = path.stat()
+            changed = (stat.st_size, stat.st_mtime_ns) != (record["size"], record["mtime_ns"])
+            sha256 = _file_sha256(path) if changed or checksums else record["sha256"]
+            if changed or sha256 != record["sha256"]:
+                report.changed.append(file_path)
+                record = self._record(
+                    record["task_id"], record["original_name"], path, sha256, record.get("caption")
+                )
+            records.append(record)
+        report.missing.extend(sorted(set(recorded) - set(on_disk)))
+        if rebuild and (not report.clean or loaded is None):
+            manifest.replace(records)
+            report.rebuilt = 1
+        return report
 
 
 class LocalPhotoStorage(FileSystemPhotoStorage):
     """Локальное хранилище фотографий"""
 
-    def __init__(self, data_dir: str) -> None:
-        super().__init__(data_dir=data_dir, storage_name="local")
+    def __init__(
+        self,
+        data_dir: str,
+        link_mode: str = "copy",
+        workers: int = 0,
+        max_pending: int | None = None,
+    ) -> None:
+        super().__init__(
+            data_dir=data_dir,
+            storage_name="local",
+            link_mode=link_mode,
+            workers=workers,
+            max_pending=max_pending,
+        )
+
+
+class ContentAddressedPhotoStorage(FileSystemPhotoStorage):
+    """Хранилище, где одинаковые фото лежат на диске один раз.
+
+    Содержимое хранится в blobs/<ab>/<cd>/<sha256>, а в каталоге прогулки —
+    жёсткая ссылка на этот файл. Число ссылок на inode и есть счётчик
+    использований: delete_photo удаляет ссылку и сам blob, когда ссылок не осталось
+    """
+
+    @property
+    def blobs_dir(self) -> Path:
+        return self.base_dir / "blobs"
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest[2:4] / digest
+
+    @property
+    def refs_lock_path(self) -> Path:
+        return self.blobs_dir / "refs"
+
+    def _ingest_bytes(self, data: bytes, target_path: Path) -> dict[str, str]:
+        digest = hashlib.sha256(data).hexdigest()
+        self._link_blob(digest, lambda partial: partial.write_bytes(data), target_path)
+        return {"sha256": digest}
+
+    def _ingest(self, source: Path, target_path: Path) -> dict[str, str]:
+        digest = _file_sha256(source)
+
+        def place(partial: Path) -> None:
+            # blob не может быть жёсткой ссылкой на оригинал: правка оригинала испортила бы адрес
+            if self.link_mode != "reflink" or not _reflink(source, partial):
+                copy_file(source, partial)
+
+        self._link_blob(digest, place, target_path)
+        return {"sha256": digest}
+
+    def _link_blob(self, digest: str, write: Callable[[Path], object], target_path: Path) -> None:
+        """Сослаться на blob из каталога прогулки, при необходимости создав его.
+
+        Содержимое пишется во временный файл без блокировки, а появление blob'а и
+        ссылки на него (как и удаление последней ссылки в _unlink) идут под общей
+        блокировкой blobs/refs, так что число ссылок не меняется между проверкой и действием
+        """
+        blob = self.blob_path(digest)
+        partial = None if blob.exists() else self._write_partial(blob, write)
+        try:
+            with locked(self.refs_lock_path):
+                if not blob.exists():
+                    if partial is None:
+                        # blob удалили, пока ждали блокировку
+                        partial = self._write_partial(blob, write)
+                    os.link(partial, blob)
+                os.link(blob, target_path)
+        finally:
+            if partial is not None:
+                partial.unlink()
+
+    @staticmethod
+    def _write_partial(blob: Path, write: Callable[[Path], object]) -> Path:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=blob.parent, suffix=".part")
+        os.close(fd)
+        partial = Path(name)
+        try:
+            write(partial)
+            # mkstemp создаёт файл с правами 0600; фото должны читаться как обычные файлы
+            os.chmod(partial, 0o644)
+        except BaseException:
+            partial.unlink()
+            raise
+        return partial
+
+    def _unlink(self, path: Path, digest: str | None = None) -> int:
+        """Удалить ссылку на фото, а blob — если это была последняя ссылка"""
+        stat = path.stat()
+        if stat.st_nlink == 1:
+            path.unlink()
+            return stat.st_size
+        blob = self.blob_path(digest) if digest else None
+        if blob is None or not _same_inode(blob, stat):
+            # манифеста нет или он устарел — адрес blob'а по содержимому
+            blob = self.blob_path(_file_sha256(path))
+        with locked(self.refs_lock_path):
+            path.unlink()
+            with suppress(FileNotFoundError):
+                if _same_inode(blob, stat) and blob.stat().st_nlink == 1:
+                    blob.unlink()
+                    return stat.st_size
+        return 0
+
+    def collect_orphans(
+        self,
+        is_live: Callable[[int], bool],
+        grace_seconds: float = 24 * 3600,
+        limit: int = 500,
+        now: float | None = None,
+    ) -> "GcReport":
+        """Как у базового хранилища; в конце полного обхода ещё и sweep_blobs"""
+        report = super().collect_orphans(is_live, grace_seconds, limit, now)
+        if report.finished:
+            report.reclaimed_blobs, freed = self.sweep_blobs(grace_seconds, now)
+            report.reclaimed_bytes += freed
+        return report
+
+    def sweep_blobs(self, grace_seconds: float = 24 * 3600, now: float | None = None) -> tuple[int, int]:
+        """Удалить blob'ы без ссылок и брошенные .part-файлы; вернуть (сколько, байт).
+
+        Такие остаются после падения между созданием blob'а и ссылки на него или
+        после удаления фото в обход хранилища. Незаконченные .part моложе
+        grace_seconds не трогаются: их ещё может дописывать другой процесс
+        """
+        removed = freed = 0
+        if not self.blobs_dir.exists():
+            return removed, freed
+        deadline = (time.time() if now is None else now) - grace_seconds
+        with locked(self.refs_lock_path):
+            # сначала брошенные .part: после os.link они держат лишнюю ссылку на blob
+            for partial in self.blobs_dir.glob("*/*/*.part"):
+                stat = partial.stat()
+                if stat.st_mtime <= deadline:
+                    partial.unlink()
+                    freed += stat.st_size if stat.st_nlink == 1 else 0
+            for blob in self.blobs_dir.glob("*/*/*"):
+                stat = blob.stat()
+                if blob.suffix != ".part" and stat.st_nlink == 1:
+                    blob.unlink()
+                    removed += 1
+                    freed += stat.st_size
+        return removed, freed
+
+    def disk_usage(self) -> tuple[int, int]:
+        """Сколько байт занимают уникальные фото и сколько заняли бы их копии"""
+        stored = referenced = 0
+        if not self.blobs_dir.exists():
+            return 0, 0
+        for blob in self.blobs_dir.glob("*/*/*"):
+            if blob.suffix == ".part":
+                continue
+            stat = blob.stat()
+            stored += stat.st_size
+            referenced += stat.st_size * (stat.st_nlink - 1)
+        return stored, referenced
+
+
+@dataclass
+class ManifestReport:
+    """Итог сверки манифестов фото с диском"""
+
+    entries: int = 0
+    photos: int = 0
+    missing: list[str] = field(default_factory=list)
+    untracked: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    rebuilt: int = 0
+
+    @property
+    def clean(self) -> bool:
+        return not (self.missing or self.untracked or self.changed)
+
+    def merge(self, other: "ManifestReport") -> None:
+        self.entries += other.entries
+        self.photos += other.photos
+        self.missing.extend(other.missing)
+        self.untracked.extend(other.untracked)
+        self.changed.extend(other.changed)
+        self.rebuilt += other.rebuilt
+
+
+@dataclass
+class GcReport:
+    """Итог одного прохода сборки осиротевших фото"""
+
+    scanned: int = 0
+    recent: int = 0
+    reclaimed_entries: list[int] = field(default_factory=list)
+    reclaimed_bytes: int = 0
+    reclaimed_blobs: int = 0
+    finished: bool = False
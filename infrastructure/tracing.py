@@ -0,0 +1,185 @@
+"""Лёгкие тайминги горячего пути: спаны, сводка за сессию и Chrome trace.
+
+Пока трассировка не включена через enable(), span() возвращает один и тот же
+пустой контекст, а @traced стоит одну проверку глобальной переменной
+"""
+from __future__ import annotations
+
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import wraps
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, ContextManager, Protocol, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass(frozen=True)
+class SpanEvent:
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+    args: dict[str, Any] = field(default_factory=dict)
+
+
+class TraceSink(Protocol):
+    def record(self, event: SpanEvent) -> None:
+        """Принять завершённый спан"""
+
+
+class SummarySink:
+    """Количество, суммарное и максимальное время по имени спана"""
+
+    def __init__(self) -> None:
+        self._stats: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, event: SpanEvent) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(event.name, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += event.duration_ns
+            stats[2] = max(stats[2], event.duration_ns)
+
+    def summary(self) -> list[dict[str, Any]]:
+        rows = [
+            {
+                "name": name,
+                "count": count,
+                "total_ms": total / 1e6,
+                "mean_ms": total / count / 1e6,
+                "max_ms": longest / 1e6,
+            }
+            for name, (count, total, longest) in self._stats.items()
+        ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def format(self) -> str:
+        lines = ["Профиль сессии (мс):"]
+        for row in self.summary():
+            lines.append(
+                f"  {row['name']}: {row['count']} x, всего {row['total_ms']:.2f}, "
+                f"в среднем {row['mean_ms']:.3f}, максимум {row['max_ms']:.3f}"
+            )
+        return "\n".join(lines)
+
+
+class ChromeTraceSink:
+    """События в формате Chrome trace (chrome://tracing, Perfetto)"""
+
+    def __init__(self) -> None:
+        self.events: list[SpanEvent] = []
+        self._pid = os.getpid()
+
+    def record(self, event: SpanEvent) -> None:
+        self.events.append(event)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "traceEvents": [
+                {
+                    "name": event.name,
+                    "ph": "X",
+                    "ts": event.start_ns / 1000,
+                    "dur": event.duration_ns / 1000,
+                    "pid": self._pid,
+                    "tid": event.thread_id,
+                    "args": event.args,
+                }
+                for event in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def dump(self, path: str) -> None:
+        Path(path).write_text(json.dumps(self.to_json(), ensure_ascii=False), encoding="utf-8")
+
+
+class Tracer:
+    def __init__(self, sinks: list[TraceSink]) -> None:
+        self.sinks = sinks
+
+    def record(self, event: SpanEvent) -> None:
+        for sink in self.sinks:
+            sink.record(event)
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer: Tracer, name: str, args: dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = 0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end = time.perf_counter_ns()
+        self._tracer.record(
+            SpanEvent(
+                name=self._name,
+                start_ns=self._start,
+                duration_ns=end - self._start,
+                thread_id=threading.get_ident(),
+                args=self._args,
+            )
+        )
+
+
+_tracer: Tracer | None = None
+_DISABLED = nullcontext()
+
+
+def enable(*sinks: TraceSink) -> Tracer:
+    global _tracer
+    _tracer = Tracer(list(sinks))
+    return _tracer
+
+
+def disable() -> None:
+    global _tracer
+    _tracer = None
+
+
+def span(name: str, **args: Any) -> ContextManager[Any]:
+    """Замер блока кода; без включённой трассировки ничего не делает"""
+    if _tracer is None:
+        return _DISABLED
+    return _Span(_tracer, name, args)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Декоратор: весь вызов функции — один спан"""
+
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _Span(_tracer, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+__all__ = [
+    "ChromeTraceSink",
+    "SpanEvent",
+    "SummarySink",
+    "Tracer",
+    "disable",
+    "enable",
+    "span",
+    "traced",
+]
@@ -1,28 +1,105 @@
+from dataclasses import replace
 import os
 from pathlib import Path
 
 from cli.menu import MainMenu
 from cli.prompts import WalkPrompter
 from cli.views import WalkView, display_message
-from domain.models import UserParams
+from domain.models import HistoryQuery, UserParams, WalkTask
 from domain.services import (
+    DatabaseQuestRepository,
+    DatabaseWalkStorage,
+    KnapsackWalkAssembler,
     MLRecommendationService,
     QuestRepository,
     ScoringService,
     WalkStorage,
 )
+from infrastructure.catalog_snapshot import CatalogSnapshot
+from infrastructure.database_storage import DatabaseStorage
+from infrastructure.history_index import HistoryIndex
+from infrastructure.id_sequence import IdSequence
 from infrastructure.json_storage import JsonStorage
-from infrastructure.photo_storage import LocalPhotoStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
+from infrastructure.photo_storage import (
+    ContentAddressedPhotoStorage,
+    FileSystemPhotoStorage,
+    GcReport,
+    LocalPhotoStorage,
+)
+from infrastructure import tracing
 from use_cases.finish_walk import FinishWalkUseCase
 from use_cases.generate_walk import GenerateWalkUseCase
 from use_cases.show_history import ShowHistoryUseCase
 
+HISTORY_PAGE_SIZE = 10
+PHOTO_GC_BATCH = 200
+PHOTO_WORKERS = 2
+
 
 def _build_storage(data_dir: str, filename: str) -> JsonStorage:
     path = Path(data_dir) / filename
     return JsonStorage(str(path))
 
 
+def _build_history_storage(data_dir: str, backend: str) -> JsonStorage | JsonLinesStorage:
+    # история общая для всех сессий с этим каталогом, поэтому пишется под блокировкой
+    if backend == "json":
+        return JsonStorage(str(Path(data_dir) / "history.json"), lock=True)
+    if backend == "jsonl":
+        storage = JsonLinesStorage(str(Path(data_dir) / "history.jsonl"), lock=True)
+        storage.migrate_from(str(Path(data_dir) / "history.json"))
+        return storage
+    raise ValueError(f"Unknown history backend: {backend}")
+
+
+def _build_database_repositories(
+    data_dir: str, quest_storage: JsonStorage
+) -> tuple[QuestRepository, WalkStorage]:
+    database = DatabaseStorage(str(Path(data_dir) / "walkie.db"))
+    quest_repo = DatabaseQuestRepository(storage=database, source=quest_storage)
+    walk_storage = DatabaseWalkStorage(storage=database, quest_repo=quest_repo)
+    legacy_history: JsonStorage | JsonLinesStorage = JsonLinesStorage(
+        str(Path(data_dir) / "history.jsonl")
+    )
+    if not legacy_history.path.exists():
+        legacy_history = _build_storage(data_dir, "history.json")
+    walk_storage.import_from(legacy_history)
+    return quest_repo, walk_storage
+
+
+def _build_ranker(data_dir: str, ranker: str) -> MLRecommendationService:
+    snapshot = _build_storage(data_dir, "ml_model.json")
+    if ranker == "python":
+        return MLRecommendationService(snapshot=snapshot)
+    if ranker == "numpy":
+        from domain.vector_ranking import VectorizedRecommendationService
+
+        return VectorizedRecommendationService(snapshot=snapshot)
+    raise ValueError(f"Unknown ranker: {ranker}")
+
+
+def _build_assembler(assembly: str) -> KnapsackWalkAssembler | None:
+    if assembly == "greedy":
+        return None
+    if assembly == "knapsack":
+        return KnapsackWalkAssembler()
+    raise ValueError(f"Unknown walk assembly: {assembly}")
+
+
+def build_photo_storage(
+    data_dir: str, photo_store: str, link_mode: str, workers: int
+) -> FileSystemPhotoStorage:
+    """Хранилище фото выбранного вида (приложение и команды обслуживания)"""
+    if photo_store == "files":
+        return LocalPhotoStorage(data_dir, link_mode=link_mode, workers=workers)
+    if photo_store == "content":
+        return ContentAddressedPhotoStorage(
+            data_dir, storage_name="local", link_mode=link_mode, workers=workers
+        )
+    raise ValueError(f"Unknown photo store: {photo_store}")
+
+
 def _seed_data_file(data_dir: str, filename: str, fallback_dir: Path) -> None:
     target_path = Path(data_dir) / filename
     if target_path.exists():
@@ -43,7 +120,7 @@ class WalkieApp:
         finisher: FinishWalkUseCase,
         historian: ShowHistoryUseCase,
         walk_storage: WalkStorage,
-        local_photo_storage: LocalPhotoStorage,
+        local_photo_storage: FileSystemPhotoStorage,
     ) -> None:
         self.menu = menu
         self.prompter = prompter
@@ -116,12 +193,25 @@ class WalkieApp:
         display_message(f"Ваш итоговый балл: {entry.score}")
 
     def _run_history(self) -> None:
-        history = self.historian.list_history()
-        if not history:
-            display_message("История пока пуста.")
-            return
-        self.view.display_history_list(history)
-        choice = input("Введите ID прогулки для подробностей (или Enter для выхода): ").strip()
+        query = HistoryQuery(limit=HISTORY_PAGE_SIZE)
+        while True:
+            page = self.historian.list_page(query)
+            if not page.total:
+                display_message("История пока пуста.")
+                return
+            self.view.display_history_page(page)
+            choice = input(
+                "Введите ID прогулки для подробностей, n/p — следующая/предыдущая страница "
+                "(или Enter для выхода): "
+            ).strip().lower()
+            if choice == "n" and page.has_next:
+                query = replace(query, offset=query.offset + query.limit)
+            elif choice == "p" and page.has_previous:
+                query = replace(query, offset=max(0, query.offset - query.limit))
+            elif choice in {"n", "p"}:
+                display_message("Других страниц нет.")
+            else:
+                break
         if not choice:
             return
         if not choice.isdigit():
@@ -137,18 +227,43 @@ class WalkieApp:
             self._run_new_walk(params=entry.params)
 
 
-def build_app(data_dir: str) -> WalkieApp:
+def build_repositories(data_dir: str, history_backend: str = "jsonl") -> tuple[QuestRepository, WalkStorage]:
+    """Каталог заданий и история для выбранного формата (приложение и команды обслуживания)"""
+    quest_storage = _build_storage(data_dir, "quests.json")
+    if history_backend == "sqlite":
+        return _build_database_repositories(data_dir, quest_storage)
+    history_storage = _build_history_storage(data_dir, history_backend)
+    quest_repo = QuestRepository(
+        storage=quest_storage,
+        snapshot=CatalogSnapshot(str(Path(data_dir) / "quests.snapshot")),
+    )
+    walk_storage = WalkStorage(
+        storage=history_storage,
+        sequence=IdSequence(str(history_storage.path) + ".seq"),
+        index=HistoryIndex(history_storage) if isinstance(history_storage, JsonLinesStorage) else None,
+        quest_repo=quest_repo,
+    )
+    return quest_repo, walk_storage
+
+
+def build_app(
+    data_dir: str,
+    history_backend: str = "jsonl",
+    ranker: str = "python",
+    assembly: str = "greedy",
+    photo_link: str = "copy",
+    photo_workers: int = PHOTO_WORKERS,
+    photo_store: str = "files",
+) -> WalkieApp:
     fallback_dir = Path(__file__).resolve().parent / "data"
     _seed_data_file(data_dir, "quests.json", fallback_dir)
     _seed_data_file(data_dir, "history.json", fallback_dir)
     
-    quest_storage = _build_storage(data_dir, "quests.json")
-    history_storage = _build_storage(data_dir, "history.json")
-    quest_repo = QuestRepository(storage=quest_storage)
-    walk_storage = WalkStorage(storage=history_storage)
-    ml_recommendation_service = MLRecommendationService()
+    quest_repo, walk_storage = build_repositories(data_dir, history_backend)
+    ml_recommendation_service = _build_ranker(data_dir, ranker)
+    assembler = _build_assembler(assembly)
     scoring_service = ScoringService()
-    local_photo_storage = LocalPhotoStorage(data_dir)
+    local_photo_storage = build_photo_storage(data_dir, photo_store, photo_link, photo_workers)
 
     return WalkieApp(
         menu=MainMenu(),
@@ -158,10 +273,14 @@ def build_app(data_dir: str) -> WalkieApp:
             quest_repo=quest_repo,
             recommendation_service=ml_recommendation_service,
             walk_storage=walk_storage,
+            assembler=assembler,
         ),
         finisher=FinishWalkUseCase(
             scoring_service=scoring_service,
             walk_storage=walk_storage,
+            recommendation_service=ml_recommendation_service,
+            photo_storage=local_photo_storage,
+            on_photo_failed=_report_failed_photo,
         ),
         historian=ShowHistoryUseCase(walk_storage=walk_storage),
         walk_storage=walk_storage,
@@ -169,13 +288,84 @@ def build_app(data_dir: str) -> WalkieApp:
     )
 
 
+def _report_failed_photo(task: WalkTask, photo: dict[str, str]) -> None:
+    display_message(
+        f"Фото к заданию «{task.quest.title}» не сохранено ({photo.get('error', 'ошибка')}), "
+        "в историю оно не попадёт."
+    )
+
+
+def collect_photo_garbage(
+    photos: LocalPhotoStorage,
+    walk_storage: WalkStorage,
+    grace_seconds: float = 24 * 3600,
+    limit: int = PHOTO_GC_BATCH,
+) -> GcReport:
+    """Сборка фото прогулок, которых нет в истории (приложение и команды обслуживания)"""
+    live = walk_storage.entry_ids()
+    return photos.collect_orphans(live.__contains__, grace_seconds=grace_seconds, limit=limit)
+
+
+def _collect_photo_garbage(app: WalkieApp) -> None:
+    """Один ограниченный проход сборки фото прерванных прогулок при выходе"""
+    report = collect_photo_garbage(app.local_photo_storage, app.walk_storage)
+    if report.reclaimed_entries:
+        display_message(
+            f"Удалены фото несохранённых прогулок: {len(report.reclaimed_entries)}, "
+            f"освобождено {report.reclaimed_bytes} байт"
+        )
+
+
+def _enable_tracing(
+    summary: bool, trace_file: str | None
+) -> tuple[tracing.SummarySink | None, tracing.ChromeTraceSink | None]:
+    summary_sink = tracing.SummarySink() if summary else None
+    chrome_sink = tracing.ChromeTraceSink() if trace_file else None
+    sinks = [sink for sink in (summary_sink, chrome_sink) if sink is not None]
+    if sinks:
+        tracing.enable(*sinks)
+    return summary_sink, chrome_sink
+
+
 def main() -> None:
     greeting = os.getenv("WALKIE_GREETING", "Добро пожаловать в Walkie!")
     data_dir = os.getenv("WALKIE_DATA_DIR", "/data")
+    history_backend = os.getenv("WALKIE_HISTORY_BACKEND", "jsonl")
+    ranker = os.getenv("WALKIE_RANKER", "python")
+    assembly = os.getenv("WALKIE_ASSEMBLY", "greedy")
+    photo_link = os.getenv("WALKIE_PHOTO_LINK", "copy")
+    photo_workers = int(os.getenv("WALKIE_PHOTO_WORKERS", str(PHOTO_WORKERS)))
+    photo_store = os.getenv("WALKIE_PHOTO_STORE", "files")
+    photo_gc = os.getenv("WALKIE_PHOTO_GC", "") not in {"", "0"}
+    trace_file = os.getenv("WALKIE_TRACE_FILE") or None
+    summary_sink, chrome_sink = _enable_tracing(
+        summary=os.getenv("WALKIE_TRACE", "") not in {"", "0"},
+        trace_file=trace_file,
+    )
     display_message(greeting)
     display_message(f"Data directory: {data_dir}")
 
-    build_app(data_dir).run()
+    try:
+        app = build_app(
+            data_dir,
+            history_backend=history_backend,
+            ranker=ranker,
+            assembly=assembly,
+            photo_link=photo_link,
+            photo_workers=photo_workers,
+            photo_store=photo_store,
+        )
+        try:
+            app.run()
+        finally:
+            app.local_photo_storage.close()
+        if photo_gc:
+            _collect_photo_garbage(app)
+    finally:
+        if summary_sink is not None:
+            display_message(summary_sink.format())
+        if chrome_sink is not None and trace_file:
+            chrome_sink.dump(trace_file)
 
 
 if __name__ == "__main__":
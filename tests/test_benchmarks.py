@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+from benchmarks.run import compare, measure_memory, run_benchmarks, write_report
+from benchmarks.synthetic import make_history, make_quests
+
+
+def test_synthetic_generators_are_deterministic() -> None:
+    quests = make_quests(50, seed=3)
+
+    assert [quest.to_dict() for quest in quests] == [quest.to_dict() for quest in make_quests(50, seed=3)]
+    assert len(make_history(quests, 20, seed=3)) == 20
+
+
+def test_benchmarks_write_comparable_report(tmp_path: Path) -> None:
+    results = run_benchmarks(
+        ["tiny"], repeat=1, only=["find_matching", "add_entry_jsonl"], sizes={"tiny": 30}
+    )
+    report_path = tmp_path / "bench.json"
+
+    write_report(results, report_path, label="test")
+
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["label"] == "test"
+    assert {item["name"] for item in report["results"]} == {"find_matching", "add_entry_jsonl"}
+    assert compare(results, report_path, threshold=0.2) == []
+
+
+def test_measure_memory_reports_bytes_per_model() -> None:
+    usage = measure_memory(30)
+
+    assert set(usage) == {"quest_bytes", "history_entry_bytes"}
+    assert 0 < usage["quest_bytes"] < usage["history_entry_bytes"]
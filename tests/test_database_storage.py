@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from domain.models import HistoryQuery
+from domain.services import (
+    DatabaseQuestRepository,
+    DatabaseWalkStorage,
+    MLRecommendationService,
+    ScoringService,
+)
+from infrastructure.database_storage import DatabaseStorage
+from infrastructure.json_storage import JsonStorage
+from main import _build_database_repositories
+from use_cases.finish_walk import FinishWalkUseCase
+from use_cases.generate_walk import GenerateWalkUseCase
+
+
+def test_database_storage_executes_and_fetches(tmp_path: Path) -> None:
+    storage = DatabaseStorage(f"sqlite:///{tmp_path / 'walkie.db'}")
+    storage.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    storage.executemany("INSERT INTO items (id, name) VALUES (?, ?)", [(1, "a"), (2, "b")])
+
+    assert storage.fetch("SELECT name FROM items WHERE id = ?", (2,)) == [{"name": "b"}]
+    assert storage.fetch("PRAGMA journal_mode")[0]["journal_mode"] == "wal"
+
+    try:
+        with storage.transaction():
+            storage.execute("DELETE FROM items")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert len(storage.fetch("SELECT id FROM items")) == 2
+
+
+def test_database_quest_repository_syncs_from_json(sample_user_params, sample_quests, tmp_path: Path) -> None:
+    source = JsonStorage(str(tmp_path / "quests.json"))
+    source.write_json([quest.to_dict() for quest in sample_quests[:1]])
+    repo = DatabaseQuestRepository(storage=DatabaseStorage(str(tmp_path / "walkie.db")), source=source)
+
+    assert [quest.id for quest in repo.find_matching(sample_user_params)] == [1]
+
+    source.write_json([quest.to_dict() for quest in sample_quests])
+
+    assert [quest.id for quest in repo.find_matching(sample_user_params)] == [1, 2]
+    assert [quest.id for quest in repo.load_quests()] == [1, 2, 3]
+
+
+def test_database_walk_storage_roundtrip(sample_history, tmp_path: Path) -> None:
+    walk_storage = DatabaseWalkStorage(storage=DatabaseStorage(str(tmp_path / "walkie.db")))
+
+    assert walk_storage.next_id() == 1
+    walk_storage.add_entry(sample_history[0])
+
+    assert walk_storage.next_id() == 2
+    assert walk_storage.next_id() == 3
+    assert walk_storage.get_entry(1).score == sample_history[0].score
+    assert walk_storage.get_entry(2) is None
+    assert [entry.id for entry in walk_storage.load_history()] == [1]
+    assert [entry.id for entry in walk_storage.iter_history()] == [1]
+    page = walk_storage.query_history(HistoryQuery(walk_type=sample_history[0].walk_type, min_score=50))
+    assert [entry.id for entry in page.entries] == [1] and page.total == 1
+    assert walk_storage.query_history(HistoryQuery(status="aborted")).total == 0
+    assert walk_storage.entry_ids() == {1}
+
+
+def test_database_repositories_import_legacy_history(sample_history, tmp_path: Path) -> None:
+    JsonStorage(str(tmp_path / "history.json")).write_json(
+        [entry.to_dict() for entry in sample_history]
+    )
+    quest_storage = JsonStorage(str(tmp_path / "quests.json"))
+
+    _, walk_storage = _build_database_repositories(str(tmp_path), quest_storage)
+
+    assert [entry.id for entry in walk_storage.load_history()] == [1]
+
+
+def test_database_storage_nested_transaction_uses_savepoint(tmp_path: Path) -> None:
+    storage = DatabaseStorage(f"sqlite:///{tmp_path / 'walkie.db'}")
+    storage.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+
+    with storage.transaction():
+        storage.execute("INSERT INTO items (id) VALUES (1)")
+        try:
+            with storage.transaction():
+                storage.execute("INSERT INTO items (id) VALUES (2)")
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        with storage.transaction():
+            storage.execute("INSERT INTO items (id) VALUES (3)")
+
+    assert [row["id"] for row in storage.fetch("SELECT id FROM items ORDER BY id")] == [1, 3]
+
+
+def test_database_walk_saved_after_quests_json_changes(
+    sample_user_params, sample_quests, sample_history, tmp_path: Path
+) -> None:
+    quest_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests])
+    quest_repo, walk_storage = _build_database_repositories(str(tmp_path), quest_storage)
+    walk = GenerateWalkUseCase(
+        quest_repo=quest_repo,
+        recommendation_service=MLRecommendationService(),
+        walk_storage=walk_storage,
+    ).execute(sample_user_params)
+    entry_id = walk_storage.next_id()
+
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests[:2]])
+    FinishWalkUseCase(scoring_service=ScoringService(), walk_storage=walk_storage).execute(
+        params=sample_user_params, tasks=walk.tasks, entry_id=entry_id
+    )
+
+    assert [task.quest.id for task in walk_storage.get_entry(entry_id).tasks] == [
+        task.quest.id for task in walk.tasks
+    ]
+    assert len(quest_repo.load_quests()) == 2
@@ -1,6 +1,20 @@
-from domain.models import WalkTask
-from domain.services import MLRecommendationService, QuestRepository, RecommendationService, ScoringService
+import json
+from dataclasses import replace
+
+import pytest
+
+from domain.models import Quest, WalkTask
+from domain.services import (
+    KnapsackWalkAssembler,
+    MLRecommendationService,
+    QuestRepository,
+    RecommendationService,
+    ScoringService,
+    WalkStorage,
+)
+from infrastructure.catalog_snapshot import CatalogSnapshot
 from infrastructure.json_storage import JsonStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
 
 
 def test_find_matching_filters_by_params(sample_user_params, sample_quests, tmp_path):
@@ -13,6 +27,19 @@ def test_find_matching_filters_by_params(sample_user_params, sample_quests, tmp_
     assert [quest.id for quest in matched] == [1, 2]
 
 
+def test_find_matching_reloads_index_when_file_changes(sample_user_params, sample_quests, tmp_path):
+    storage = JsonStorage(str(tmp_path / "quests.json"))
+    storage.write_json([quest.to_dict() for quest in sample_quests[:1]])
+    repo = QuestRepository(storage=storage)
+
+    assert [quest.id for quest in repo.find_matching(sample_user_params)] == [1]
+
+    storage.write_json([quest.to_dict() for quest in sample_quests])
+
+    assert [quest.id for quest in repo.find_matching(sample_user_params)] == [1, 2]
+    assert len(repo.load_quests()) == 3
+
+
 def test_recommendation_prioritizes_unseen(sample_history, sample_quests):
     service = RecommendationService()
 
@@ -42,6 +69,14 @@ def test_scoring_accounts_for_completion_and_photos(sample_quests):
     assert service.calculate_score(tasks) == 55
 
 
+def test_scoring_ignores_photos_that_failed_to_save(sample_quests):
+    service = ScoringService()
+
+    tasks = [WalkTask(quest=sample_quests[0], photos=[{"path": "1.jpg", "status": "failed"}])]
+
+    assert service.calculate_score(tasks) == 0
+
+
 def test_scoring_caps_at_100(sample_quests):
     service = ScoringService()
 
@@ -54,3 +89,228 @@ def test_scoring_empty_tasks_is_zero():
     service = ScoringService()
 
     assert service.calculate_score([]) == 0
+
+
+def test_ml_recommendation_sync_matches_full_refresh(
+    sample_history, sample_quests, sample_user_params, tmp_path
+):
+    walk_storage = WalkStorage(storage=JsonLinesStorage(str(tmp_path / "history.jsonl")))
+    entries = [replace(sample_history[0], id=entry_id) for entry_id in (1, 2, 3)]
+    incremental = MLRecommendationService()
+    incremental.rank(sample_quests, walk_storage, sample_user_params)
+    for entry in entries:
+        walk_storage.add_entry(entry)
+        incremental.sync(walk_storage)
+
+    full = MLRecommendationService()
+    full.fit(entries)
+
+    assert incremental._mood_weights == full._mood_weights
+    assert incremental._quest_counts == full._quest_counts
+    assert incremental.rank(sample_quests, walk_storage, sample_user_params) == full.rank(
+        sample_quests, entries, sample_user_params
+    )
+
+
+def test_ml_recommendation_skips_history_reads_while_signature_is_unchanged(
+    sample_history, sample_quests, sample_user_params, tmp_path
+):
+    walk_storage = WalkStorage(storage=JsonStorage(str(tmp_path / "history.json")))
+    walk_storage.add_entry(sample_history[0])
+    service = MLRecommendationService()
+    service.rank(sample_quests, walk_storage, sample_user_params)
+
+    def unexpected_read(*args):
+        raise AssertionError("history should not be read")
+
+    walk_storage.history_mark = unexpected_read
+    walk_storage.iter_history = unexpected_read
+    ranked = service.rank(sample_quests, walk_storage, sample_user_params)
+
+    assert [quest.id for quest in ranked] == [1, 2]
+
+
+def test_ml_recommendation_restores_snapshot_without_history(
+    sample_history, sample_quests, sample_user_params, tmp_path
+):
+    walk_storage = WalkStorage(storage=JsonLinesStorage(str(tmp_path / "history.jsonl")))
+    walk_storage.add_entry(sample_history[0])
+    MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json"))).sync(walk_storage)
+
+    def untouched_history():
+        raise AssertionError("history should not be scanned")
+
+    walk_storage.iter_history = untouched_history
+    restored = MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json")))
+    restored.sync(walk_storage)
+    ranked = restored.rank(sample_quests, walk_storage, sample_user_params)
+
+    assert [quest.id for quest in ranked] == [1, 2]
+
+
+def test_ml_recommendation_sync_applies_only_new_entries(
+    sample_history, sample_quests, sample_user_params, tmp_path
+):
+    walk_storage = WalkStorage(storage=JsonLinesStorage(str(tmp_path / "history.jsonl")))
+    walk_storage.add_entry(sample_history[0])
+    first = MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json")))
+    second = MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json")))
+    first.sync(walk_storage)
+    second.sync(walk_storage)
+
+    # две сессии по очереди дописывают историю и догоняют общий снимок
+    walk_storage.add_entry(replace(sample_history[0], id=2))
+    first.sync(walk_storage)
+    walk_storage.add_entry(replace(sample_history[0], id=3))
+    walk_storage.iter_history = lambda: (_ for _ in ()).throw(AssertionError("full rescan"))
+    second.sync(walk_storage)
+
+    expected = MLRecommendationService()
+    expected.fit([replace(sample_history[0], id=entry_id) for entry_id in (1, 2, 3)])
+    restored = MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json")))
+    restored.sync(walk_storage)
+
+    assert second._quest_counts == expected._quest_counts == {2: 3}
+    assert restored._mood_weights == expected._mood_weights
+    assert restored._mark == (3, 3)
+
+
+def test_ml_recommendation_sync_rebuilds_when_history_is_replaced(
+    sample_history, sample_quests, sample_user_params, tmp_path
+):
+    walk_storage = WalkStorage(storage=JsonLinesStorage(str(tmp_path / "history.jsonl")))
+    walk_storage.add_entry(sample_history[0])
+    walk_storage.add_entry(replace(sample_history[0], id=2))
+    service = MLRecommendationService(snapshot=JsonStorage(str(tmp_path / "ml_model.json")))
+    service.sync(walk_storage)
+
+    walk_storage.storage.write_json([replace(sample_history[0], id=5).to_dict()])
+    service.sync(walk_storage)
+
+    assert service._quest_counts == {2: 1}
+    assert service._mark == (1, 5)
+
+
+def test_ml_recommendation_reuses_quest_features(sample_quests, sample_user_params):
+    service = MLRecommendationService()
+    service.rank(sample_quests, [], sample_user_params)
+    features = service._features[1]
+
+    service.rank(sample_quests, [], sample_user_params)
+    assert service._features[1] is features
+
+    changed = Quest(id=1, title="Changed", walk_type="solo", mood=["fun"], goals=["relax"], duration=10)
+    ranked = service.rank([changed, sample_quests[1]], [], sample_user_params)
+
+    assert service._features[1] is not features
+    assert [quest.id for quest in ranked] == [2, 1]
+
+
+def test_iter_rank_yields_rank_order(sample_history, sample_quests, sample_user_params):
+    service = MLRecommendationService()
+    quests = sample_quests + [
+        Quest(id=10 + idx, title="Tie", walk_type="solo", mood=["calm"], goals=["relax"], duration=5)
+        for idx in range(5)
+    ]
+
+    ranked = service.rank(quests, sample_history, sample_user_params)
+    lazy = service.iter_rank(quests, sample_history, sample_user_params)
+
+    assert next(lazy) is ranked[0]
+    assert [ranked[0], *lazy] == ranked
+
+
+def test_iter_recommended_matches_recommend(sample_history, sample_quests):
+    service = RecommendationService()
+
+    assert list(service.iter_recommended(sample_quests, sample_history)) == service.recommend(
+        sample_quests, sample_history
+    )
+
+
+def _timed_quest(quest_id: int, duration: int) -> Quest:
+    return Quest(id=quest_id, title=f"Q{quest_id}", walk_type="solo", mood=[], goals=[], duration=duration)
+
+
+def test_knapsack_assembler_beats_greedy_fill():
+    scored = [
+        (5.0, _timed_quest(1, 20)),
+        (4.0, _timed_quest(2, 15)),
+        (4.0, _timed_quest(3, 15)),
+    ]
+
+    chosen = KnapsackWalkAssembler().assemble(scored, time_limit=30)
+
+    assert [quest.id for quest in chosen] == [2, 3]
+
+
+def test_knapsack_assembler_falls_back_when_out_of_time(monkeypatch):
+    scored = [(float(idx % 7), _timed_quest(idx, 1 + idx % 30)) for idx in range(3000)]
+    # бюджет уже потрачен сортировкой и отсевом — ДП не запускается вовсе
+    monkeypatch.setattr(
+        KnapsackWalkAssembler, "_solve_exact", staticmethod(lambda *args: pytest.fail("dp started"))
+    )
+
+    chosen = KnapsackWalkAssembler(time_budget=0.0).assemble(scored, time_limit=300)
+
+    assert chosen
+    assert sum(quest.duration for quest in chosen) <= 300
+
+
+def test_quest_from_dict_interns_and_freezes_lists(sample_quests):
+    data = sample_quests[0].to_dict()
+    first = Quest.from_dict(json.loads(json.dumps(data)))
+    second = Quest.from_dict(json.loads(json.dumps(data)))
+
+    assert first == sample_quests[0]
+    assert isinstance(first.mood, tuple) and isinstance(sample_quests[0].mood, tuple)
+    assert first.mood[0] is second.mood[0]
+    assert not hasattr(first, "__dict__")
+    assert first.to_dict() == data
+
+
+def test_placeholder_tasks_are_stored_as_references(sample_quests):
+    placeholder = Quest.placeholder(42)
+
+    assert placeholder.is_placeholder
+    assert not sample_quests[0].is_placeholder
+    assert not replace(placeholder, walk_type="solo").is_placeholder
+    assert WalkTask(quest=placeholder).to_dict() == {"quest_id": 42, "completed": False}
+
+
+def test_snapshot_catalog_outlives_catalog_reload(sample_user_params, sample_quests, tmp_path):
+    storage = JsonStorage(str(tmp_path / "quests.json"))
+    storage.write_json([quest.to_dict() for quest in sample_quests])
+    snapshot_path = str(tmp_path / "quests.snapshot")
+    QuestRepository(storage=storage, snapshot=CatalogSnapshot(snapshot_path)).load_quests()
+    repo = QuestRepository(storage=JsonStorage(storage.path), snapshot=CatalogSnapshot(snapshot_path))
+    held = repo.quests_by_id()
+
+    # каталог меняется, репозиторий перечитывает его и пересобирает снимок, пока held ещё в ходу
+    storage.write_json([quest.to_dict() for quest in sample_quests[:1]])
+    repo.find_matching(sample_user_params)
+
+    assert len(held) == len(sample_quests)
+    assert held[3] == sample_quests[2]
+    assert list(repo.quests_by_id()) == [sample_quests[0].id]
+
+
+def test_quest_repository_loads_catalog_from_snapshot(sample_user_params, sample_quests, tmp_path):
+    storage = JsonStorage(str(tmp_path / "quests.json"))
+    storage.write_json([quest.to_dict() for quest in sample_quests])
+    snapshot_path = str(tmp_path / "quests.snapshot")
+    from_json = QuestRepository(storage=storage, snapshot=CatalogSnapshot(snapshot_path))
+    expected = from_json.find_matching(sample_user_params)
+
+    repo = QuestRepository(storage=JsonStorage(storage.path), snapshot=CatalogSnapshot(snapshot_path))
+
+    assert repo.find_matching(sample_user_params) == expected
+    assert repo._catalog is not None
+    assert repo.quests_by_id()[3] == sample_quests[2]
+    assert repo.quests_by_id().get(42) is None
+    assert repo.load_quests() == sample_quests
+    assert repo.catalog_version() == from_json.catalog_version()
+
+    storage.write_json([quest.to_dict() for quest in sample_quests[:1]])
+    assert repo.find_matching(sample_user_params) == sample_quests[:1]
+    assert repo._catalog is None
@@ -0,0 +1,121 @@
+from dataclasses import replace
+import json
+from pathlib import Path
+
+from domain.services import WalkStorage
+from infrastructure.history_index import HistoryIndex
+from infrastructure.id_sequence import IdSequence
+from infrastructure.jsonl_storage import JsonLinesStorage
+from main import _build_history_storage
+
+
+def test_jsonl_storage_appends_one_line_per_entry(sample_history, tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    walk_storage = WalkStorage(storage=storage)
+
+    walk_storage.add_entry(sample_history[0])
+    walk_storage.add_entry(sample_history[0])
+
+    lines = storage.path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["id"] == 1
+    assert len(walk_storage.load_history()) == 2
+
+
+def test_jsonl_storage_drops_torn_last_line(tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    storage.append_json({"id": 1})
+    with storage.path.open("a", encoding="utf-8") as file:
+        file.write('{"id": 2, "da')
+
+    assert storage.read_json(default=[]) == [{"id": 1}]
+
+    storage.append_json({"id": 3})
+    assert storage.read_json(default=[]) == [{"id": 1}, {"id": 3}]
+
+
+def test_history_storage_migrates_legacy_array_once(sample_history, tmp_path: Path) -> None:
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([entry.to_dict() for entry in sample_history]), encoding="utf-8")
+
+    storage = _build_history_storage(str(tmp_path), "jsonl")
+
+    assert isinstance(storage, JsonLinesStorage)
+    assert [item["id"] for item in storage.read_json(default=[])] == [1]
+
+    legacy.write_text("[]", encoding="utf-8")
+    storage = _build_history_storage(str(tmp_path), "jsonl")
+    assert len(storage.read_json(default=[])) == 1
+
+
+def test_walk_storage_streams_history_lookups(sample_history, tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    for entry_id in (3, 1, 7):
+        storage.append_json({**sample_history[0].to_dict(), "id": entry_id})
+    with storage.path.open("a", encoding="utf-8") as file:
+        file.write('{"id": 99, "da')
+    walk_storage = WalkStorage(storage=storage)
+
+    assert [entry.id for entry in walk_storage.iter_history()] == [3, 1, 7]
+    assert walk_storage.get_entry(1).score == sample_history[0].score
+    assert walk_storage.get_entry(99) is None
+    assert walk_storage.next_id() == 8
+
+
+def test_id_sequence_allocates_unique_ids(sample_history, tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    storage.append_json({**sample_history[0].to_dict(), "id": 5})
+    first = WalkStorage(storage=storage, sequence=IdSequence(str(storage.path) + ".seq"))
+    second = WalkStorage(storage=storage, sequence=IdSequence(str(storage.path) + ".seq"))
+
+    assert first.next_id() == 6
+    assert second.next_id() == 7
+
+    first.add_entry(replace(sample_history[0], id=20))
+    assert second.next_id() == 21
+
+
+def test_history_index_seeks_to_entry_and_catches_up(sample_history, tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    walk_storage = WalkStorage(storage=storage, index=HistoryIndex(storage))
+    for entry_id in (2, 4):
+        walk_storage.add_entry(replace(sample_history[0], id=entry_id))
+
+    assert walk_storage.get_entry(4).id == 4
+    assert walk_storage.get_entry(3) is None
+
+    walk_storage.add_entry(replace(sample_history[0], id=9))
+    reopened = WalkStorage(storage=storage, index=HistoryIndex(storage))
+    assert reopened.get_entry(9).id == 9
+    assert reopened.index.ids() == [2, 4, 9]
+    assert reopened.entry_ids() == {2, 4, 9}
+    assert WalkStorage(storage=storage).entry_ids() == {2, 4, 9}
+
+    storage.write_json([{**sample_history[0].to_dict(), "id": 5}])
+    assert reopened.get_entry(4) is None
+    assert reopened.get_entry(5).id == 5
+
+
+def test_history_index_file_is_append_only(sample_history, tmp_path: Path) -> None:
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    walk_storage = WalkStorage(storage=storage, index=HistoryIndex(storage))
+    walk_storage.add_entry(replace(sample_history[0], id=1))
+    assert walk_storage.history_mark() == (1, 1)
+    index_path = walk_storage.index.path
+    inode, before = index_path.stat().st_ino, index_path.read_bytes()
+
+    other = HistoryIndex(storage)
+    walk_storage.add_entry(replace(sample_history[0], id=2))
+    assert walk_storage.history_mark() == (2, 2)
+    assert index_path.stat().st_ino == inode
+    assert index_path.read_bytes().startswith(before)
+    assert other.ids() == [1, 2]
+
+    # оборванная пачка не учитывается, а индекс переписывается целиком
+    with index_path.open("ab") as file:
+        file.write(b'[3, 999, "2024')
+    walk_storage.add_entry(replace(sample_history[0], id=3))
+    reopened = HistoryIndex(storage)
+    assert reopened.ids() == [1, 2, 3]
+    assert storage.read_at(reopened.offset_of(3))["id"] == 3
+    assert index_path.stat().st_ino != inode
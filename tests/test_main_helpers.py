@@ -1,8 +1,11 @@
+import json
 from pathlib import Path
 
+import pytest
+
+from infrastructure.file_lock import locked
 from infrastructure.json_storage import JsonStorage
-from infrastructure.database_storage import DatabaseStorage
-from main import _build_storage, _seed_data_file
+from main import _build_assembler, _build_storage, _seed_data_file
 
 
 def test_build_storage_returns_json_storage(tmp_path: Path) -> None:
@@ -21,6 +24,60 @@ def test_json_storage_creates_file_on_read(tmp_path: Path) -> None:
     assert storage.path.exists()
 
 
+def test_json_storage_reuses_parsed_document(tmp_path: Path) -> None:
+    storage = JsonStorage(str(tmp_path / "state.json"))
+    storage.write_json([{"id": 1}])
+
+    first = storage.read_json(default=[])
+
+    assert storage.read_json(default=[]) is first
+
+    storage.path.write_text('[{"id": 1}, {"id": 2}]', encoding="utf-8")
+    assert len(storage.read_json(default=[])) == 2
+
+    cached = storage.read_json(default=[])
+    storage.invalidate()
+    assert storage.read_json(default=[]) is not cached
+
+
+def test_json_storage_cache_is_independent_of_written_object(tmp_path: Path) -> None:
+    storage = JsonStorage(str(tmp_path / "state.json"))
+    weights = {"calm": 1.0}
+    storage.write_json(weights)
+
+    weights["calm"] = 5.0
+
+    assert storage.read_json(default={}) == {"calm": 1.0}
+
+
+
+def test_json_storage_iter_json_streams_across_chunks(tmp_path: Path) -> None:
+    records = [{"id": index, "note": "]," * index, "value": 15000000000.5} for index in range(1, 6)]
+    path = tmp_path / "history.json"
+    path.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    assert list(JsonStorage(str(path)).iter_json(chunk_size=7)) == records
+
+
+def test_json_storage_write_is_atomic(tmp_path: Path, monkeypatch) -> None:
+    storage = JsonStorage(str(tmp_path / "history.json"), lock=True)
+    storage.append_json({"id": 1})
+    inode = storage.path.stat().st_ino
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("infrastructure.atomic_file.os.replace", fail)
+    with pytest.raises(OSError):
+        storage.append_json({"id": 2})
+
+    assert json.loads(storage.path.read_text(encoding="utf-8")) == [{"id": 1}]
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+    monkeypatch.undo()
+    storage.append_json({"id": 3})
+    assert JsonStorage(str(storage.path)).read_json(default=[]) == [{"id": 1}, {"id": 3}]
+    assert storage.path.stat().st_ino != inode
+
 def test_seed_data_file_copies_once(tmp_path: Path) -> None:
     data_dir = tmp_path / "data"
     fallback_dir = tmp_path / "fallback"
@@ -37,26 +94,18 @@ def test_seed_data_file_copies_once(tmp_path: Path) -> None:
     assert target_file.read_text(encoding="utf-8") == "changed"
 
 
-def test_database_storage_not_implemented() -> None:
-    storage = DatabaseStorage("dsn")
-
-    try:
-        storage.connect()
-    except NotImplementedError:
-        pass
-    else:
-        raise AssertionError("connect should raise NotImplementedError")
-
-    try:
-        storage.fetch("SELECT 1")
-    except NotImplementedError:
-        pass
-    else:
-        raise AssertionError("fetch should raise NotImplementedError")
-
-    try:
-        storage.execute("DELETE")
-    except NotImplementedError:
-        pass
-    else:
-        raise AssertionError("execute should raise NotImplementedError")
+def test_file_lock_is_reentrant_within_a_thread(tmp_path: Path) -> None:
+    storage = JsonStorage(str(tmp_path / "history.json"), lock=True)
+
+    with locked(storage.path):
+        storage.write_json([{"id": 1}])
+        storage.append_json({"id": 2})
+
+    assert [item["id"] for item in storage.read_json(default=[])] == [1, 2]
+
+
+def test_build_assembler_rejects_unknown_mode() -> None:
+    assert _build_assembler("greedy") is None
+    assert _build_assembler("knapsack") is not None
+    with pytest.raises(ValueError):
+        _build_assembler("optimal")
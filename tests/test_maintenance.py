@@ -0,0 +1,144 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from cli.maintenance import main as maintenance_main
+from domain.models import Quest
+from domain.services import QuestRepository, WalkStorage
+from infrastructure.json_storage import JsonStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
+from infrastructure.photo_manifest import PhotoManifest
+from infrastructure.photo_storage import LocalPhotoStorage
+
+
+def test_compact_history_stores_quest_ids_and_rehydrates(sample_history, sample_quests, tmp_path: Path) -> None:
+    quest_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests])
+    history_path = tmp_path / "history.jsonl"
+    JsonLinesStorage(str(history_path)).write_json([entry.to_dict() for entry in sample_history])
+    full_size = history_path.stat().st_size
+
+    assert maintenance_main(["--data-dir", str(tmp_path), "compact-history"]) == 0
+
+    record = json.loads(history_path.read_text(encoding="utf-8"))
+    assert record["tasks"][0]["quest_id"] == sample_quests[1].id
+    assert "quest" not in record["tasks"][0]
+    assert history_path.stat().st_size < full_size
+
+    walk_storage = WalkStorage(
+        storage=JsonLinesStorage(str(history_path)),
+        quest_repo=QuestRepository(storage=quest_storage),
+    )
+    assert walk_storage.load_history()[0].tasks[0].quest == sample_quests[1]
+
+    edited = [Quest.from_dict({**quest.to_dict(), "title": "B edited", "duration": 60}) for quest in sample_quests]
+    quest_storage.write_json([quest.to_dict() for quest in edited])
+    assert walk_storage.get_entry(1).tasks[0].quest == sample_quests[1]
+
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests if quest.id != 2])
+    assert walk_storage.get_entry(1).tasks[0].quest == sample_quests[1]
+    for archive in (tmp_path / "catalogs").iterdir():
+        archive.unlink()
+    assert WalkStorage(
+        storage=JsonLinesStorage(str(history_path)),
+        quest_repo=QuestRepository(storage=quest_storage),
+    ).get_entry(1).tasks[0].quest == Quest.placeholder(2)
+
+
+def test_compact_history_keeps_quests_changed_since_the_walk(sample_history, sample_quests, tmp_path: Path) -> None:
+    changed = [Quest.from_dict({**quest.to_dict(), "duration": 99}) for quest in sample_quests]
+    quest_repo = QuestRepository(storage=JsonStorage(str(tmp_path / "quests.json")))
+    quest_repo.storage.write_json([quest.to_dict() for quest in changed])
+    walk_storage = WalkStorage(storage=JsonStorage(str(tmp_path / "history.json")), quest_repo=quest_repo)
+
+    walk_storage.add_entry(sample_history[0])
+
+    assert walk_storage.compact() == (1, 0)
+    assert walk_storage.load_history()[0].tasks[0].quest.duration == sample_quests[1].duration
+
+
+def test_verify_photos_rebuilds_manifest_from_disk(tmp_path: Path) -> None:
+    storage = LocalPhotoStorage(str(tmp_path))
+    stored = storage.store_photo(entry_id=1, task_id=1, filename="a.jpg", data=b"a")
+    legacy = tmp_path / "photos" / "local" / "1" / "task_2" / "20240101_120000_old.jpg"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"old")
+    (tmp_path / stored["file_path"]).write_bytes(b"changed")
+
+    assert maintenance_main(["--data-dir", str(tmp_path), "verify-photos"]) == 1
+    assert maintenance_main(["--data-dir", str(tmp_path), "verify-photos", "--rebuild"]) == 0
+    assert maintenance_main(["--data-dir", str(tmp_path), "verify-photos", "--checksums"]) == 0
+
+    [photo] = storage.list_photos(entry_id=1, task_id=2)
+    assert photo["file_path"] == str(legacy.relative_to(tmp_path))
+    records = PhotoManifest(legacy.parents[1]).read()
+    assert {record["original_name"]: record["size"] for record in records} == {"a.jpg": 7, "old.jpg": 3}
+
+
+def test_verify_photos_rebuilds_corrupt_manifest(tmp_path: Path) -> None:
+    storage = LocalPhotoStorage(str(tmp_path))
+    stored = storage.store_photo(entry_id=1, task_id=1, filename="a.jpg", data=b"a")
+    manifest = PhotoManifest(tmp_path / "photos" / "local" / "1")
+    manifest.path.write_bytes(manifest.path.read_bytes()[:10])
+
+    assert not manifest.exists()
+    assert storage.list_photos(entry_id=1, task_id=1)[0]["file_path"] == stored["file_path"]
+    report = storage.verify_manifests(rebuild=True)
+
+    assert report.rebuilt == 1
+    assert [record["original_name"] for record in manifest.read()] == ["a.jpg"]
+
+
+def test_gc_photos_reclaims_unsaved_walks_in_batches(sample_history, tmp_path: Path) -> None:
+    JsonLinesStorage(str(tmp_path / "history.jsonl")).write_json([entry.to_dict() for entry in sample_history])
+    storage = LocalPhotoStorage(str(tmp_path))
+    saved = storage.store_photo(entry_id=1, task_id=1, filename="a.jpg", data=b"a")
+    for entry_id in (7, 8):
+        storage.store_photo(entry_id=entry_id, task_id=1, filename="b.jpg", data=b"bb")
+    old = time.time() - 2 * 24 * 3600
+    for path in (tmp_path / "photos" / "local").rglob("*"):
+        os.utime(path, (old, old))
+    storage.store_photo(entry_id=9, task_id=1, filename="c.jpg", data=b"ccc")
+
+    def is_live(entry_id: int) -> bool:
+        return entry_id == 1
+
+    orphan_bytes = sum(
+        path.stat().st_size
+        for entry_id in (7, 8)
+        for path in (tmp_path / "photos" / "local" / str(entry_id)).rglob("*")
+        if path.is_file()
+    )
+
+    first = storage.collect_orphans(is_live, limit=2)
+    second = storage.collect_orphans(is_live, limit=2)
+
+    assert (first.reclaimed_entries, first.finished) == ([7], False)
+    assert (second.reclaimed_entries, second.recent, second.finished) == ([8], 1, True)
+    assert first.reclaimed_bytes + second.reclaimed_bytes == orphan_bytes
+    assert (tmp_path / saved["file_path"]).exists()
+    assert not (tmp_path / "photos" / "local" / "7").exists()
+    assert storage.list_photos(entry_id=9, task_id=1)
+
+    assert maintenance_main(["--data-dir", str(tmp_path), "gc-photos", "--grace-hours", "0"]) == 0
+    assert sorted(path.name for path in (tmp_path / "photos" / "local").iterdir() if path.is_dir()) == ["1"]
+
+
+def test_compact_history_keeps_unresolved_quests_as_references(sample_history, sample_quests, tmp_path: Path) -> None:
+    quest_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests if quest.id != 2])
+    history_path = tmp_path / "history.jsonl"
+    record = sample_history[0].to_dict()
+    record["tasks"] = [{"quest_id": 2, "completed": True}]
+    JsonLinesStorage(str(history_path)).write_json([record])
+
+    assert maintenance_main(["--data-dir", str(tmp_path), "compact-history"]) == 0
+
+    assert json.loads(history_path.read_text(encoding="utf-8"))["tasks"][0]["quest_id"] == 2
+    quest_storage.write_json([quest.to_dict() for quest in sample_quests])
+    walk_storage = WalkStorage(
+        storage=JsonLinesStorage(str(history_path)),
+        quest_repo=QuestRepository(storage=quest_storage),
+    )
+    assert walk_storage.get_entry(1).tasks[0].quest == sample_quests[1]
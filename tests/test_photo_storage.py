@@ -1,6 +1,11 @@
+import os
 from pathlib import Path
 
-from infrastructure.photo_storage import LocalPhotoStorage
+import pytest
+
+from infrastructure import photo_storage
+from infrastructure.photo_manifest import PhotoManifest
+from infrastructure.photo_storage import ContentAddressedPhotoStorage, LocalPhotoStorage
 
 
 def test_local_photo_storage_saves_and_lists(tmp_path: Path) -> None:
@@ -37,3 +42,104 @@ def test_local_photo_storage_deletes(tmp_path: Path) -> None:
 
     storage.delete_photo(metadata["file_path"])
     assert not stored_path.exists()
+
+
+def test_store_photo_file_copies_without_leftovers(tmp_path: Path) -> None:
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"x" * (3 << 20))
+    storage = LocalPhotoStorage(str(tmp_path / "data"))
+
+    metadata = storage.store_photo_file(entry_id=1, task_id=1, source_path=source)
+
+    stored_path = tmp_path / "data" / metadata["file_path"]
+    assert stored_path.read_bytes() == source.read_bytes()
+    assert stored_path.name.endswith("_source.jpg")
+    assert [path.name for path in stored_path.parent.iterdir()] == [stored_path.name]
+
+
+def test_store_photo_file_hardlink_mode_shares_inode(tmp_path: Path) -> None:
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"local-photo")
+    storage = LocalPhotoStorage(str(tmp_path / "data"), link_mode="hardlink")
+
+    metadata = storage.store_photo_file(entry_id=2, task_id=1, source_path=source)
+
+    stored_path = tmp_path / "data" / metadata["file_path"]
+    assert stored_path.stat().st_ino == source.stat().st_ino
+    assert storage.list_photos(entry_id=2, task_id=1) == [metadata]
+
+
+def test_store_photo_file_in_background_until_flush(tmp_path: Path) -> None:
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"local-photo")
+    storage = LocalPhotoStorage(str(tmp_path / "data"), workers=1, max_pending=1)
+
+    metadata = [
+        storage.store_photo_file(entry_id=4, task_id=task_id, source_path=source)
+        for task_id in range(1, 4)
+    ]
+    storage.flush()
+
+    assert all("status" not in item for item in metadata)
+    assert all((tmp_path / "data" / item["file_path"]).exists() for item in metadata)
+    storage.close()
+
+
+def test_content_addressed_storage_stores_duplicates_once(tmp_path: Path) -> None:
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"same-photo")
+    storage = ContentAddressedPhotoStorage(str(tmp_path / "data"), storage_name="local")
+
+    first = storage.store_photo_file(entry_id=1, task_id=1, source_path=source)
+    second = storage.store_photo(entry_id=2, task_id=1, filename="copy.jpg", data=b"same-photo")
+
+    assert first["sha256"] == second["sha256"]
+    blob = storage.blob_path(first["sha256"])
+    assert (tmp_path / "data" / second["file_path"]).read_bytes() == b"same-photo"
+    assert blob.stat().st_nlink == 3
+    assert storage.disk_usage() == (10, 20)
+
+    storage.delete_photo(first["file_path"])
+    assert blob.exists()
+    storage.delete_photo(second["file_path"])
+    assert not blob.exists()
+    assert not (tmp_path / "data" / second["file_path"]).exists()
+
+
+def test_content_addressed_storage_sweeps_unreferenced_blobs(tmp_path: Path, monkeypatch) -> None:
+    storage = ContentAddressedPhotoStorage(str(tmp_path / "data"), storage_name="local")
+    kept = storage.store_photo(entry_id=1, task_id=1, filename="a.jpg", data=b"kept")
+    blob = storage.blob_path(kept["sha256"])
+    assert blob.stat().st_mode & 0o777 == 0o644
+
+    # падение между созданием blob'а и ссылкой на него
+    lost = storage.blob_path("ab" * 32)
+    lost.parent.mkdir(parents=True)
+    lost.write_bytes(b"lost")
+    stale = blob.with_name("stale.part")
+    os.link(blob, stale)
+    os.utime(stale, (0, 0))
+
+    assert storage.sweep_blobs(grace_seconds=60) == (1, 4)
+    assert not lost.exists() and not stale.exists()
+    assert blob.stat().st_nlink == 2
+
+    # адрес blob'а берётся из манифеста, без повторного хеширования
+    monkeypatch.setattr(photo_storage, "_file_sha256", lambda path: pytest.fail("rehashed"))
+    storage.delete_photo(kept["file_path"])
+    assert not blob.exists()
+
+
+def test_manifest_tracks_stored_and_deleted_photos(tmp_path: Path) -> None:
+    storage = LocalPhotoStorage(str(tmp_path))
+    kept = storage.store_photo(entry_id=5, task_id=1, filename="a.jpg", data=b"a", caption="Парк")
+    dropped = storage.store_photo(entry_id=5, task_id=2, filename="b.jpg", data=b"bb")
+
+    storage.delete_photo(dropped["file_path"])
+
+    records = PhotoManifest(tmp_path / "photos" / "local" / "5").read()
+    assert [record["original_name"] for record in records] == ["a.jpg"]
+    assert records[0]["size"] == 1
+    assert records[0]["caption"] == "Парк"
+    assert storage.list_photos(entry_id=5, task_id=1) == [kept]
+    assert storage.list_photos(entry_id=5, task_id=2) == []
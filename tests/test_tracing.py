@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+
+from infrastructure import tracing
+from infrastructure.json_storage import JsonStorage
+from main import _enable_tracing
+
+
+def test_span_is_noop_when_disabled() -> None:
+    tracing.disable()
+
+    assert tracing.span("anything") is tracing.span("other")
+
+
+def test_traced_calls_reach_summary_and_chrome_trace(tmp_path: Path) -> None:
+    summary, chrome = _enable_tracing(summary=True, trace_file=str(tmp_path / "trace.json"))
+    try:
+        storage = JsonStorage(str(tmp_path / "state.json"))
+        storage.write_json([1])
+        storage.invalidate()
+        storage.read_json(default=[])
+        with tracing.span("custom", step=1):
+            pass
+    finally:
+        tracing.disable()
+
+    names = {row["name"]: row["count"] for row in summary.summary()}
+    assert names["json_storage.write_json"] == 1
+    assert names["json_storage.read_json"] == 1
+    assert "custom" in summary.format()
+
+    chrome.dump(str(tmp_path / "trace.json"))
+    events = json.loads((tmp_path / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+    assert {event["ph"] for event in events} == {"X"}
+    assert any(event["args"] == {"step": 1} for event in events)
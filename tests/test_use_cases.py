@@ -1,6 +1,17 @@
-from domain.models import WalkTask
-from domain.services import MLRecommendationService, QuestRepository, ScoringService, WalkStorage
+from dataclasses import replace
+
+from domain.models import HistoryQuery, UserParams, WalkTask
+from domain.services import (
+    KnapsackWalkAssembler,
+    MLRecommendationService,
+    QuestRepository,
+    ScoringService,
+    WalkStorage,
+)
+from infrastructure.history_index import HistoryIndex
 from infrastructure.json_storage import JsonStorage
+from infrastructure.jsonl_storage import JsonLinesStorage
+from infrastructure.photo_storage import LocalPhotoStorage
 from use_cases.finish_walk import FinishWalkUseCase
 from use_cases.generate_walk import GenerateWalkUseCase
 from use_cases.show_history import ShowHistoryUseCase
@@ -53,6 +64,39 @@ def test_finish_walk_persists_entry(sample_user_params, sample_quests, tmp_path)
     assert saved[0]["comment"] == "Отличная прогулка"
 
 
+def test_finish_walk_waits_for_background_photos(sample_user_params, sample_quests, tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(b"photo" * 100_000)
+    photos = LocalPhotoStorage(str(tmp_path / "data"), workers=2)
+    stored = photos.store_photo_file(entry_id=1, task_id=1, source_path=source)
+    failed = photos.store_photo_file(entry_id=1, task_id=2, source_path=tmp_path / "missing.jpg")
+    storage = JsonStorage(str(tmp_path / "history.json"))
+    reported = []
+    use_case = FinishWalkUseCase(
+        scoring_service=ScoringService(),
+        walk_storage=WalkStorage(storage=storage),
+        photo_storage=photos,
+        on_photo_failed=lambda task, photo: reported.append((task.quest.id, photo["status"])),
+    )
+
+    entry = use_case.execute(
+        params=sample_user_params,
+        tasks=[
+            WalkTask(quest=sample_quests[0], completed=True, photos=[stored]),
+            WalkTask(quest=sample_quests[1], completed=False, photos=[failed]),
+        ],
+    )
+    photos.close()
+
+    saved = storage.read_json(default=[])[0]["tasks"]
+    assert "status" not in saved[0]["photos"][0]
+    assert (tmp_path / "data" / saved[0]["photos"][0]["file_path"]).exists()
+    # несохранённое фото сразу сообщается и не попадает ни в историю, ни в балл
+    assert reported == [(sample_quests[1].id, "failed")]
+    assert saved[1]["photos"] == []
+    assert entry.score == 55 and entry.tasks[1].photos == []
+
+
 def test_show_history_reads_entries(sample_history, tmp_path):
     storage = JsonStorage(str(tmp_path / "history.json"))
     storage.write_json([entry.to_dict() for entry in sample_history])
@@ -65,3 +109,100 @@ def test_show_history_reads_entries(sample_history, tmp_path):
     assert len(history) == 1
     assert use_case.get_history_entry(entry_id=1) is not None
     assert use_case.get_history_entry(entry_id=999) is None
+
+
+def test_generate_walk_stops_ranking_when_budget_is_spent(sample_user_params, sample_quests, tmp_path):
+    quests_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quests_storage.write_json([quest.to_dict() for quest in sample_quests])
+    consumed: list[int] = []
+
+    class RecordingRanker(MLRecommendationService):
+        def iter_rank(self, quests, history, params):
+            for quest in super().iter_rank(quests, history, params):
+                consumed.append(quest.id)
+                yield quest
+
+    use_case = GenerateWalkUseCase(
+        quest_repo=QuestRepository(storage=quests_storage),
+        recommendation_service=RecordingRanker(),
+        walk_storage=WalkStorage(storage=JsonStorage(str(tmp_path / "history.json"))),
+    )
+
+    walk = use_case.execute(
+        UserParams(walk_type="solo", mood="calm", goal="relax", time_limit=10)
+    )
+
+    assert [task.quest.id for task in walk.tasks] == [1]
+    assert consumed == [1]
+
+
+def test_generate_walk_with_knapsack_assembler_fills_budget(
+    sample_user_params, sample_quests, sample_history, tmp_path
+):
+    quests_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quests_storage.write_json([quest.to_dict() for quest in sample_quests])
+    history_storage = JsonStorage(str(tmp_path / "history.json"))
+    history_storage.write_json([entry.to_dict() for entry in sample_history])
+
+    use_case = GenerateWalkUseCase(
+        quest_repo=QuestRepository(storage=quests_storage),
+        recommendation_service=MLRecommendationService(),
+        walk_storage=WalkStorage(storage=history_storage),
+        assembler=KnapsackWalkAssembler(),
+    )
+
+    walk = use_case.execute(
+        UserParams(walk_type="solo", mood="calm", goal="relax", time_limit=30)
+    )
+
+    assert [task.quest.id for task in walk.tasks] == [1, 2]
+
+
+def test_generate_many_matches_single_requests(sample_quests, sample_history, tmp_path):
+    quests_storage = JsonStorage(str(tmp_path / "quests.json"))
+    quests_storage.write_json([quest.to_dict() for quest in sample_quests])
+    history_storage = JsonStorage(str(tmp_path / "history.json"))
+    history_storage.write_json([entry.to_dict() for entry in sample_history])
+    use_case = GenerateWalkUseCase(
+        quest_repo=QuestRepository(storage=quests_storage),
+        recommendation_service=MLRecommendationService(),
+        walk_storage=WalkStorage(storage=history_storage),
+    )
+    params_list = [
+        UserParams(walk_type="solo", mood="calm", goal="relax", time_limit=10),
+        UserParams(walk_type="dog", mood="active", goal="exercise", time_limit=30),
+        UserParams(walk_type="solo", mood="Calm", goal="relax", time_limit=30),
+    ]
+
+    expected = [[task.quest.id for task in use_case.execute(params).tasks] for params in params_list]
+
+    for workers in (None, 2):
+        walks = use_case.generate_many(params_list, workers=workers)
+        assert [[task.quest.id for task in walk.tasks] for walk in walks] == expected
+
+
+def test_show_history_pages_newest_first_with_filters(sample_history, tmp_path):
+    storage = JsonLinesStorage(str(tmp_path / "history.jsonl"))
+    walk_storage = WalkStorage(storage=storage, index=HistoryIndex(storage))
+    base = sample_history[0]
+    for entry_id, date, status in [
+        (1, "2024-01-01T10:00", "finished"),
+        (2, "2024-01-02T10:00", "aborted"),
+        (3, "2024-01-03T10:00", "finished"),
+        (4, "2024-02-01T10:00", "finished"),
+    ]:
+        walk_storage.add_entry(replace(base, id=entry_id, date=date, status=status))
+    use_case = ShowHistoryUseCase(walk_storage=walk_storage)
+
+    page = use_case.list_page(HistoryQuery(limit=2))
+    assert [entry.id for entry in page.entries] == [4, 3]
+    assert page.total == 4 and page.has_next and not page.has_previous
+
+    query = HistoryQuery(status="finished", date_to="2024-01-31", offset=1, limit=2)
+    page = use_case.list_page(query)
+    assert [entry.id for entry in page.entries] == [1]
+    assert page.total == 2 and not page.has_next
+
+    plain = ShowHistoryUseCase(walk_storage=WalkStorage(storage=storage))
+    assert [entry.id for entry in plain.list_page(query).entries] == [1]
+    assert page.entries[0].total_duration == sum(task.quest.duration for task in base.tasks)
@@ -0,0 +1,114 @@
+from dataclasses import replace
+import random
+
+import pytest
+
+from domain.models import HistoryEntry, Quest, UserParams, WalkTask
+from domain.services import MLRecommendationService
+
+pytest.importorskip("numpy")
+
+from domain.vector_ranking import VectorizedRecommendationService  # noqa: E402
+
+MOODS = ["calm", "fun", "active", "romantic", "mindful", "calm mindful"]
+GOALS = ["relax", "explore", "exercise", "have fun", "explore city"]
+
+
+def _catalog(size: int, seed: int) -> list[Quest]:
+    rng = random.Random(seed)
+    return [
+        Quest(
+            id=quest_id,
+            title=f"Quest {quest_id}",
+            walk_type=rng.choice(["solo", "pair", "dog"]),
+            mood=rng.sample(MOODS, rng.randint(0, 3)),
+            goals=rng.sample(GOALS, rng.randint(0, 3)),
+            duration=rng.choice([5, 10, 15, 20]),
+        )
+        for quest_id in range(1, size + 1)
+    ]
+
+
+def _history(quests: list[Quest], size: int, seed: int) -> list[HistoryEntry]:
+    rng = random.Random(seed)
+    params = UserParams(walk_type="solo", mood="calm", goal="relax", time_limit=30)
+    return [
+        HistoryEntry(
+            id=entry_id,
+            date="2024-01-01T10:00",
+            walk_type="solo",
+            params=params,
+            tasks=[
+                WalkTask(
+                    quest=rng.choice(quests),
+                    completed=rng.random() < 0.5,
+                    photos=[{"file_path": "p.jpg"}] * rng.randint(0, 2),
+                )
+                for _ in range(3)
+            ],
+            score=50,
+            status="finished",
+        )
+        for entry_id in range(1, size + 1)
+    ]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_vectorized_ranker_matches_python_ranker(seed):
+    quests = _catalog(300, seed)
+    history = _history(quests, 40, seed)
+    python_ranker = MLRecommendationService()
+    vector_ranker = VectorizedRecommendationService()
+
+    for walk_type in ["solo", "pair", "dog"]:
+        for mood in MOODS + ["unknown", "Calm"]:
+            for goal in GOALS + [""]:
+                params = UserParams(walk_type=walk_type, mood=mood, goal=goal, time_limit=60)
+                expected = python_ranker.rank(quests, history, params)
+                actual = vector_ranker.rank(quests, history, params)
+                assert [quest.id for quest in actual] == [quest.id for quest in expected]
+
+
+def test_vectorized_ranker_follows_catalog_and_history_changes(sample_quests, sample_history, sample_user_params):
+    python_ranker = MLRecommendationService()
+    vector_ranker = VectorizedRecommendationService()
+    vector_ranker.rank(sample_quests, sample_history, sample_user_params)
+
+    changed = [
+        Quest(id=1, title="Changed", walk_type="solo", mood=["fun"], goals=["explore"], duration=10),
+        *sample_quests[1:],
+    ]
+    for ranker in (python_ranker, vector_ranker):
+        ranker.rank(changed, sample_history, sample_user_params)
+        ranker.fit([*sample_history, replace(sample_history[0], id=2)])
+
+    expected = python_ranker.rank(changed, None, sample_user_params)
+    actual = vector_ranker.rank(changed, None, sample_user_params)
+
+    assert [quest.id for quest in actual] == [quest.id for quest in expected]
+
+
+def test_vectorized_iter_rank_matches_rank():
+    quests = _catalog(500, 7)
+    history = _history(quests, 20, 7)
+    ranker = VectorizedRecommendationService()
+    params = UserParams(walk_type="solo", mood="calm", goal="relax", time_limit=60)
+
+    expected = [quest.id for quest in ranker.rank(quests, history, params)]
+
+    assert [quest.id for quest in ranker.iter_rank(quests, history, params)] == expected
+
+
+def test_vectorized_ranker_keeps_quests_with_same_id_apart(sample_user_params):
+    old = Quest(id=1, title="Old", walk_type="solo", mood=["fun"], goals=["explore"], duration=10)
+    new = Quest(id=1, title="New", walk_type="solo", mood=["calm"], goals=["relax"], duration=10)
+    other = Quest(id=2, title="Other", walk_type="solo", mood=["active"], goals=[], duration=10)
+    python_ranker = MLRecommendationService()
+    vector_ranker = VectorizedRecommendationService()
+
+    for quests in ([old, other, new], [new, other, old]):
+        expected = python_ranker.score(quests, [], sample_user_params)
+        actual = vector_ranker.score(quests, [], sample_user_params)
+        assert [(quest.title, score) for score, quest in actual] == [
+            (quest.title, score) for score, quest in expected
+        ]
@@ -1,14 +1,22 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Callable
 
 from domain.models import HistoryEntry, UserParams, WalkTask
+from domain.ports import PhotoStorage, QuestRanker
 from domain.services import ScoringService, WalkStorage
+from infrastructure.tracing import traced
 
 
 @dataclass
 class FinishWalkUseCase:
     scoring_service: ScoringService
     walk_storage: WalkStorage
+    recommendation_service: QuestRanker | None = None
+    photo_storage: PhotoStorage | None = None
+    # вызывается сразу для каждого фото, которое не удалось сохранить в фоне
+    on_photo_failed: Callable[[WalkTask, dict[str, str]], None] | None = None
 
+    @traced("finish_walk.execute")
     def execute(
         self,
         params: UserParams,
@@ -17,6 +25,11 @@ class FinishWalkUseCase:
         status: str = "finished",
         comment: str | None = None,
     ) -> HistoryEntry:
+        if self.photo_storage is not None:
+            # статусы фото (готово или ошибка) должны попасть в историю уже окончательными
+            self.photo_storage.flush()
+        # несохранённые фото в историю не попадают: ни в балл, ни в веса модели
+        tasks = [self._drop_failed_photos(task) for task in tasks]
         score = self.scoring_service.calculate_score(tasks)
         if entry_id is None:
             entry_id = self.walk_storage.next_id()
@@ -30,6 +43,18 @@ class FinishWalkUseCase:
             entry_id=entry_id,
         )
         self.walk_storage.add_entry(entry)
+        if self.recommendation_service is not None:
+            self.recommendation_service.sync(self.walk_storage)
         return entry
 
+    def _drop_failed_photos(self, task: WalkTask) -> WalkTask:
+        saved = task.saved_photos
+        if len(saved) == len(task.photos):
+            return task
+        if self.on_photo_failed is not None:
+            for photo in task.photos:
+                if photo.get("status") == "failed":
+                    self.on_photo_failed(task, photo)
+        return replace(task, photos=saved)
+
 __all__ = ["FinishWalkUseCase"]
@@ -1,16 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from typing import Iterable, Sequence
 
-from domain.models import UserParams, Walk, WalkTask
-from domain.services import MLRecommendationService, QuestRepository, WalkStorage
+from domain.models import Quest, UserParams, Walk, WalkTask
+from domain.ports import QuestRanker
+from domain.services import KnapsackWalkAssembler, QuestRepository, WalkStorage
+from infrastructure.tracing import traced
+
+GroupKey = tuple[str, str, str]
+
+
+def _fill_greedy(ranked: Iterable[Quest], time_limit: int, shortest: int) -> Walk:
+    tasks: list[WalkTask] = []
+    remaining = time_limit
+    if remaining < shortest:
+        return Walk(tasks=tasks)
+    for quest in ranked:
+        if quest.duration <= remaining:
+            tasks.append(WalkTask(quest=quest))
+            remaining -= quest.duration
+            if remaining < shortest:
+                # ни одно оставшееся задание уже не поместится
+                break
+    return Walk(tasks=tasks)
+
+
+def _generate_group(
+    ranker: QuestRanker,
+    assembler: KnapsackWalkAssembler | None,
+    quests: list[Quest],
+    group: list[UserParams],
+) -> list[Walk]:
+    """Одна группа запросов с одинаковыми walk_type/mood/goal: ранжирование один раз"""
+    params = group[0]
+    # модель уже догнана до истории в generate_many: None — ранжировать по ней
+    if assembler is not None:
+        scored = ranker.score(quests, None, params)
+        return [
+            Walk(tasks=[WalkTask(quest=quest) for quest in assembler.assemble(scored, item.time_limit)])
+            for item in group
+        ]
+    shortest = min((quest.duration for quest in quests if quest.walk_type == params.walk_type), default=0)
+    ranked = ranker.rank(quests, None, params)
+    return [_fill_greedy(ranked, item.time_limit, shortest) for item in group]
+
+
+_worker_state: tuple[QuestRanker, KnapsackWalkAssembler | None] | None = None
+
+
+def _init_worker(ranker: QuestRanker, assembler: KnapsackWalkAssembler | None) -> None:
+    """Прогретая модель передаётся в процесс один раз, а не с каждой группой"""
+    global _worker_state
+    _worker_state = (ranker, assembler)
+
+
+def _generate_group_in_worker(quests: list[Quest], group: list[UserParams]) -> list[Walk]:
+    assert _worker_state is not None
+    ranker, assembler = _worker_state
+    return _generate_group(ranker, assembler, quests, group)
 
 
 @dataclass
 class GenerateWalkUseCase:
     quest_repo: QuestRepository
-    recommendation_service: MLRecommendationService
+    recommendation_service: QuestRanker
     walk_storage: WalkStorage
+    assembler: KnapsackWalkAssembler | None = None
 
-    def execute(self, params: UserParams) -> Walk:
+    def _candidates(self, params: UserParams) -> list[Quest]:
         quests = self.quest_repo.find_matching(params)
         if not quests:
             quests = [
@@ -18,15 +75,74 @@ class GenerateWalkUseCase:
                 for quest in self.quest_repo.load_quests()
                 if quest.walk_type == params.walk_type
             ]
-        history = self.walk_storage.load_history()
-        recommended = self.recommendation_service.rank(quests, history, params)
-        tasks: list[WalkTask] = []
-        remaining = params.time_limit
-        for quest in recommended:
-            if quest.duration <= remaining:
-                tasks.append(WalkTask(quest=quest))
-                remaining -= quest.duration
-        return Walk(tasks=tasks)
-        
+        return quests
+
+    @traced("generate_walk.execute")
+    def execute(self, params: UserParams) -> Walk:
+        quests = self._candidates(params)
+        if self.assembler is not None:
+            scored = self.recommendation_service.score(quests, self.walk_storage, params)
+            chosen = self.assembler.assemble(scored, params.time_limit)
+            return Walk(tasks=[WalkTask(quest=quest) for quest in chosen])
+        shortest = min(
+            (quest.duration for quest in quests if quest.walk_type == params.walk_type),
+            default=0,
+        )
+        if params.time_limit < shortest:
+            return Walk(tasks=[])
+        ranked = self.recommendation_service.iter_rank(quests, self.walk_storage, params)
+        return _fill_greedy(ranked, params.time_limit, shortest)
+
+    @staticmethod
+    def _group_key(params: UserParams) -> GroupKey:
+        # ранжирование и фильтр зависят только от этих значений в нижнем регистре
+        return params.walk_type, params.mood.lower(), params.goal.lower()
+
+    @traced("generate_walk.generate_many")
+    def generate_many(
+        self, params_list: Sequence[UserParams], workers: int | None = None
+    ) -> list[Walk]:
+        """Прогулки для многих запросов сразу, в том же порядке
+
+        Каталог и история читаются один раз, подбор и ранжирование кандидатов
+        делаются один раз на группу с одинаковыми walk_type/mood/goal;
+        при workers > 1 группы считаются в пуле процессов
+        """
+        groups: dict[GroupKey, list[int]] = {}
+        for index, params in enumerate(params_list):
+            groups.setdefault(self._group_key(params), []).append(index)
+        if not groups:
+            return []
+        # модель догоняется по истории один раз на весь пакет
+        self.recommendation_service.sync(self.walk_storage)
+
+        jobs = [
+            (self._candidates(params_list[indexes[0]]), [params_list[i] for i in indexes])
+            for indexes in groups.values()
+        ]
+        if workers is not None and workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.recommendation_service, self.assembler),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _generate_group_in_worker,
+                        [quests for quests, _ in jobs],
+                        [group for _, group in jobs],
+                    )
+                )
+        else:
+            results = [
+                _generate_group(self.recommendation_service, self.assembler, quests, group)
+                for quests, group in jobs
+            ]
+
+        walks: dict[int, Walk] = {}
+        for indexes, group_walks in zip(groups.values(), results):
+            walks.update(zip(indexes, group_walks))
+        return [walks[index] for index in range(len(params_list))]
+
 
 __all__ = ["GenerateWalkUseCase"]
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from domain.models import HistoryEntry
+from domain.models import HistoryEntry, HistoryPage, HistoryQuery
 from domain.services import WalkStorage
 
 
@@ -11,6 +11,10 @@ class ShowHistoryUseCase:
     def list_history(self) -> list[HistoryEntry]:
         return self.walk_storage.load_history()
 
+    def list_page(self, query: HistoryQuery | None = None) -> HistoryPage:
+        """Одна страница истории, сначала новые прогулки"""
+        return self.walk_storage.query_history(query or HistoryQuery())
+
     def get_history_entry(self, entry_id: int) -> HistoryEntry | None:
         return self.walk_storage.get_entry(entry_id)
 __all__ = ["ShowHistoryUseCase"]